@@ -30,54 +30,64 @@ SOLARISZONES_GROUP = cfg.OptGroup(
     help=('Configuration options for the nova-solariszones driver.')
 )
 
-SOLARISZONES_OPTS = [
-    cfg.StrOpt('boot_volume_type',
-               default=None,
-               help='Cinder volume type to use for boot volumes'),
-    cfg.StrOpt('boot_volume_az',
-               default=None,
-               help='Cinder availability zone to use for boot volumes'),
-    cfg.StrOpt('glancecache_dirname',
-               default='/var/share/nova/images',
-               help='Default path to Glance cache for Solaris Zones.'),
-    cfg.StrOpt('nfs_username',
-               default=None,
-               help='Username used to mount NFS volumes.'),
-    cfg.StrOpt('nfs_groupname',
-               default=None,
-               help='Groupname used to mount NFS volumes.'),
-    cfg.StrOpt('live_migration_cipher',
-               help='Cipher to use for encryption of memory traffic during '
-                    'live migration. If not specified, a common encryption '
-                    'algorithm will be negotiated. Options include: none or '
-                    'the name of a supported OpenSSL cipher algorithm.'),
-    cfg.StrOpt('solariszones_snapshots_directory',
-               default='$instances_path/snapshots',
-               help='Location to store snapshots before uploading them to the '
-                    'Glance image service.'),
-    cfg.StrOpt('zones_suspend_path',
-               default='/var/share/zones/SYSsuspend',
-               help='Default path for suspend images for Solaris Zones.'),
-    cfg.BoolOpt('solariszones_boot_options',
-                default=True,
-                help='Allow kernel boot options to be set in instance '
-                     'metadata.'),
-]
-
-
-ALL_OPTS = [
-    (SOLARISZONES_GROUP, SOLARISZONES_OPTS)
-]
+# (name, option class, default, help[, extra keyword arguments]) for each
+# option in the solariszones group.
+_OPT_SPECS = (
+    ('boot_volume_type', cfg.StrOpt, None,
+     'Cinder volume type to use for boot volumes'),
+    ('boot_volume_az', cfg.StrOpt, None,
+     'Cinder availability zone to use for boot volumes'),
+    ('glancecache_dirname', cfg.StrOpt, '/var/share/nova/images',
+     'Default path to Glance cache for Solaris Zones.'),
+    ('nfs_username', cfg.StrOpt, None,
+     'Username used to mount NFS volumes.'),
+    ('nfs_groupname', cfg.StrOpt, None,
+     'Groupname used to mount NFS volumes.'),
+    ('live_migration_cipher', cfg.StrOpt, None,
+     'Cipher to use for encryption of memory traffic during live '
+     'migration. If not specified, a common encryption algorithm will be '
+     'negotiated. Options include: none or the name of a supported OpenSSL '
+     'cipher algorithm.'),
+    ('solariszones_snapshots_directory', cfg.StrOpt,
+     '$instances_path/snapshots',
+     'Location to store snapshots before uploading them to the Glance '
+     'image service.'),
+    ('zones_suspend_path', cfg.StrOpt, '/var/share/zones/SYSsuspend',
+     'Default path for suspend images for Solaris Zones.'),
+    ('solariszones_boot_options', cfg.BoolOpt, True,
+     'Allow kernel boot options to be set in instance metadata.'),
+    ('zone_lookup_cache_ttl', cfg.IntOpt, 2,
+     'Number of seconds a zone looked up by name via RAD is reused before '
+     'being looked up again. Set to 0 to disable caching.',
+     {'min': 0}),
+    ('volume_create_timeout', cfg.IntOpt, 300,
+     'Number of seconds to wait for a Cinder volume created by the driver '
+     'to leave the creating state.',
+     {'min': 1}),
+)
+
+SOLARISZONES_OPTS = tuple(
+    opt_cls(name, default=default, help=help, **(extra[0] if extra else {}))
+    for name, opt_cls, default, help, *extra in _OPT_SPECS)
+
+
+ALL_OPTS = (
+    (SOLARISZONES_GROUP, SOLARISZONES_OPTS),
+)
+
+
+_REGISTERED = False
 
 
 def register_opts():
+    global _REGISTERED
+    if _REGISTERED:
+        return
     for group, opts in ALL_OPTS:
         CONF.register_group(group)
         CONF.register_opts(opts, group=group)
+    _REGISTERED = True
 
 
 def list_opts():
     return ALL_OPTS
-
-
-register_opts()
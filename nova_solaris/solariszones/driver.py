@@ -20,14 +20,19 @@
 Driver for Solaris Zones (nee Containers):
 """
 import base64
-import glob
+import contextlib
+import functools
+import hashlib
 import os
 import platform
+import re
 import shutil
 import tempfile
+import time
+import types
 import uuid
 
-from collections import defaultdict
+from collections import defaultdict, deque
 from nova import block_device
 import rad.bindings.com.oracle.solaris.rad.archivemgr_1 as archivemgr
 import rad.bindings.com.oracle.solaris.rad.kstat_2 as kstat
@@ -37,6 +42,7 @@ import rad.bindings.com.oracle.solaris.rad.bemgr_1 as bemgr
 import rad.client
 import rad.connect
 
+from eventlet import greenpool
 from eventlet import greenthread
 from lxml import etree
 import os_resource_classes as orc
@@ -46,10 +52,9 @@ from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import excutils
 from oslo_utils import fileutils
-from oslo_utils import strutils
 from oslo_utils import versionutils
 from oslo_utils import units
-from passlib.hash import sha256_crypt
+from passlib.context import CryptContext
 
 import nova
 from nova.api.metadata import base as instance_metadata
@@ -78,6 +83,7 @@ from nova.virt import event as virtevent
 from nova.virt import hardware
 from nova.virt import images
 
+from nova_solaris.solariszones import config
 from nova_solaris.solariszones import sysconfig
 from nova_solaris.solariszones import utils
 from nova_solaris.solariszones.config import CONF
@@ -126,6 +132,13 @@ ZONE_BRAND_TEMPLATE = {
     ZONE_BRAND_SOLARIS_KZ: 'SYSsolaris-kz',
 }
 
+# Global zonecfg properties that may be set through 'zonecfg:' scoped flavor
+# extra specs, for 'solaris' branded zones and for all other brands.
+# TODO(dcomay): Should figure this out via the brands themselves.
+ZONECFG_GLOBAL_PROPS_SOLARIS = frozenset([
+    'bootargs', 'hostid', 'file-mac-profile', 'fs-allowed', 'limitpriv'])
+ZONECFG_GLOBAL_PROPS_OTHER = frozenset(['bootargs', 'hostid', 'cpu-arch'])
+
 MAX_CONSOLE_BYTES = 102400
 
 VNC_CONSOLE_BASE_FMRI = 'svc:/application/openstack/nova/zone-vnc-console'
@@ -144,6 +157,87 @@ HYPERVISOR_VERSION = '5.11'
 
 shared_storage = ['iscsi', 'fibre_channel']
 
+# Number of consecutive RAD calls made in a loop before yielding to other
+# greenthreads.
+RAD_YIELD_INTERVAL = 16
+
+# Number of seconds a cached os.sysconf() value that may change at run time
+# (e.g. the number of online CPUs) is reused.
+SYSCONF_CACHE_TTL = 60
+
+# Number of seconds the parsed 'fcinfo hba-port' output is reused before
+# the HBA ports are queried again.
+FC_HBA_CACHE_TTL = 60
+
+# Initial and maximum number of seconds between checks of the state of an
+# SMF service that is starting up.
+SMF_POLL_INTERVAL = 0.2
+SMF_POLL_INTERVAL_MAX = 2.0
+
+# Task states in which the zone keeps its existing system configuration, so
+# no SC profiles are generated. A rebuild (as opposed to an evacuation) is
+# the exception for REBUILD_SPAWNING.
+SYSCONFIG_SKIP_TASK_STATES = frozenset([
+    task_states.RESIZE_FINISH,
+    task_states.RESIZE_REVERTING,
+    task_states.RESIZE_MIGRATING,
+    task_states.REBUILD_SPAWNING,
+])
+
+# Number of seconds to keep trying to reach a zone's cloudbase-init service
+# while waiting for it to copy the config drive, and the initial and maximum
+# number of seconds between checks of its state.
+COPYDONE_TIMEOUT = 120
+COPYDONE_POLL_INTERVAL = 0.1
+COPYDONE_POLL_INTERVAL_MAX = 5.0
+
+# Hashes root passwords for zones, using SHA-256 crypt with the passlib
+# default number of rounds.
+PASSWORD_CONTEXT = CryptContext(schemes=['sha256_crypt'],
+                                sha256_crypt__default_rounds=535000)
+
+# SMF service that is online once a zone's local file systems are mounted,
+# the number of seconds to wait for it after booting a zone, and the initial
+# and maximum number of seconds between polls of it.
+FS_LOCAL_FMRI = 'svc:/system/filesystem/local:default'
+ZONE_LOGIN_TIMEOUT = 60
+ZONE_LOGIN_POLL_INTERVAL = 0.5
+ZONE_LOGIN_POLL_INTERVAL_MAX = 5.0
+
+# Initial and maximum number of seconds between polls of a Cinder volume
+# that is still being created.
+VOLUME_POLL_INTERVAL = 0.25
+VOLUME_POLL_INTERVAL_MAX = 4.0
+
+# Multipliers of the unit suffixes allowed in zonecfg size values.
+_UNIT_SCALE = {
+    'K': units.Ki,
+    'M': units.Mi,
+    'G': units.Gi,
+    'T': units.Ti,
+}
+
+# Matches a zonecfg 'ncpus' value, either a single number or a range.
+_CPU_RANGE_RE = re.compile(r'^(\d+)(?:-(\d+))?$')
+
+# Matches one 'fcinfo hba-port' block, capturing the port WWN, port mode,
+# state and node WWN. The tempered dot keeps a match from running into the
+# next 'HBA Port WWN:' block when a field is missing.
+_FCINFO_HBA_RE = re.compile(
+    r"HBA Port WWN:\s*(\S+)"
+    r"(?:(?!HBA Port WWN:).)*?Port Mode:\s*(\S+)"
+    r"(?:(?!HBA Port WWN:).)*?State:\s*(\S+)"
+    r"(?:(?!HBA Port WWN:).)*?Node WWN:\s*(\S+)",
+    re.DOTALL)
+
+# Match the lines of 'suriadm lookup-uri' output holding a luname-only URI.
+# iSCSI lookups accept any URI naming the LU; Fibre Channel lookups need
+# the 'lu:' form.
+_ISCSI_LUNAME_URI_RE = re.compile(r"^[^\S\n]*(.*luname\.naa\..*?)[^\S\n]*$",
+                                  re.MULTILINE)
+_FC_LUNAME_URI_RE = re.compile(r"^[^\S\n]*(lu:luname\.naa\..*?)[^\S\n]*$",
+                               re.MULTILINE)
+
 KSTAT_TYPE = {
     'NVVT_STR': 'string',
     'NVVT_STRS': 'strings',
@@ -153,6 +247,102 @@ KSTAT_TYPE = {
 }
 
 
+@functools.lru_cache(maxsize=256)
+def _kstat_uri_pattern(uri):
+    """Return the (cached) RAD glob pattern matching the given kstat URI."""
+    return rad.client.ADRGlobPattern({"uri": uri})
+
+
+def _parse_cpu_range(ncpus):
+    """Return the (minimum, maximum) number of CPUs of a zonecfg 'ncpus'
+    value such as '2' or '2-4', or (None, None) if it cannot be parsed.
+    """
+    match = _CPU_RANGE_RE.match(ncpus)
+    if match is None:
+        return None, None
+    low = int(match.group(1))
+    high = match.group(2)
+    return low, int(high) if high is not None else low
+
+
+def _parse_size_kb(size):
+    """Return the number of KBytes in a zonecfg size value such as '4G',
+    '512m' or '1073741824'.
+    """
+    scale = _UNIT_SCALE.get(size[-1:].upper())
+    if scale is None:
+        return int(size) // units.Ki
+    return int(float(size[:-1]) * scale) // units.Ki
+
+
+def _vnc_console_fmri(name):
+    """Return the FMRI of the VNC console SMF instance of the named zone."""
+    return '%s:%s' % (VNC_CONSOLE_BASE_FMRI, name)
+
+
+def _xml_files(base):
+    """Yield the path of every XML file in the tree rooted at base."""
+    stack = [base]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.xml'):
+                    yield entry.path
+
+
+def _cleanup_sc_dir(sc_dir):
+    """Remove the SC profile directory of a spawn.
+
+    The directory normally only holds the profile files written for the
+    instance, so unlink those directly; anything else, such as a copied
+    install:sc_profile tree, is left to shutil.rmtree().
+    """
+    try:
+        with os.scandir(sc_dir) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    break
+                os.unlink(entry.path)
+            else:
+                os.rmdir(sc_dir)
+                return
+    except OSError:
+        pass
+    shutil.rmtree(sc_dir)
+
+
+def _scan_sc_profile(path):
+    """Return a (root_account, nodename) tuple telling whether the SC profile
+    at path configures the root account in system/config-user and the node
+    name in system/identity.
+    """
+    root_account = False
+    nodename = False
+    service = None
+    for event, elem in etree.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            if elem.tag == 'service':
+                service = elem.get('name')
+            elif (elem.tag == 'property_group' and
+                    service == 'system/config-user' and
+                    elem.get('name') == 'root_account'):
+                root_account = True
+            elif (elem.tag == 'propval' and service == 'system/identity' and
+                    elem.get('name') == 'nodename'):
+                nodename = True
+        else:
+            if elem.tag == 'service':
+                service = None
+            # Nothing is needed from an element once it has been seen.
+            elem.clear()
+
+        if root_account and nodename:
+            break
+
+    return root_account, nodename
+
 
 class MemoryAlignmentIncorrect(exception.FlavorMemoryTooSmall):
     msg_fmt = _("Requested flavor, %(flavor)s, memory size %(memsize)s does "
@@ -198,90 +388,88 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
     def __init__(self, virtapi):
         LOG.debug("__init__")
+        config.register_opts()
         self.virtapi = virtapi
-        self._be_manager = None
-        self._archive_manager = None
+        self._compute_arch = platform.processor()
         self._compute_event_callback = None
         self._conductor_api = conductor.API()
+        self._extra_specs_cache = {}
         self._fc_hbas = None
+        self._fc_hbas_time = 0
+        self._fc_online_wwnns = []
+        self._fc_online_wwpns = []
         self._fc_wwnns = None
         self._fc_wwpns = None
         self._host_stats = {}
         self._initiator = None
         self._install_engine = None
-        self._kstat_control = None
         self._pagesize = os.sysconf('SC_PAGESIZE')
+        self._password_fingerprints = {}
+        # Solaris page sizes are always a multiple of 1 KByte.
+        self._pages_to_kb_factor = self._pagesize // units.Ki
+        self._sc_phys_pages = os.sysconf('SC_PHYS_PAGES')
+        self._sysconf_cache = {}
         self._rad_connection = None
+        self._rad_gen = 0
+        self._rad_objects = {}
         self._rootzpool_suffix = ROOTZPOOL_RESOURCE
         self._uname = os.uname()
-        self._validated_archives = list()
+        self._validated_archives = set()
+        self._vnc_port_cache = {}
+        self._vnc_tools_present = False
         self._volume_api = SolarisVolumeAPI()
-        self._zone_manager = None
+        self._zone_cache = {}
 
-    @property
-    def rad_connection(self):
-        if self._rad_connection is None:
+    def _ensure_rad(self):
+        """Return the RAD connection, reconnecting if it has been lost.
+
+        Every reconnection bumps the connection generation so that RAD
+        objects obtained from the previous connection are fetched again.
+        """
+        # taken from rad.connect.RadConnection.__repr__ to look for a
+        # closed connection
+        if (self._rad_connection is None or
+                self._rad_connection._closed is not None):
             self._rad_connection = rad.connect.connect_unix()
-        else:
-            # taken from rad.connect.RadConnection.__repr__ to look for a
-            # closed connection
-            if self._rad_connection._closed is not None:
-                # the RAD connection has been lost.  Reconnect to RAD
-                self._rad_connection = rad.connect.connect_unix()
+            self._rad_gen += 1
 
         return self._rad_connection
 
     @property
-    def zone_manager(self):
+    def rad_connection(self):
+        return self._ensure_rad()
+
+    def _get_rad_object(self, interface):
+        """Return the singleton RAD object for interface, obtained at most
+        once per RAD connection.
+        """
         try:
-            if (self._zone_manager is None or
-                    self._zone_manager._conn._closed is not None):
-                self._zone_manager = self.rad_connection.get_object(
-                    zonemgr.ZoneManager())
+            conn = self._ensure_rad()
+            gen, obj = self._rad_objects.get(interface, (None, None))
+            if gen != self._rad_gen:
+                obj = conn.get_object(interface())
+                self._rad_objects[interface] = (self._rad_gen, obj)
         except Exception as ex:
             reason = _("Unable to obtain RAD object: %s") % ex
             raise exception.NovaException(reason)
 
-        return self._zone_manager
+        return obj
 
     @property
-    def kstat_control(self):
-        try:
-            if (self._kstat_control is None or
-                    self._kstat_control._conn._closed is not None):
-                self._kstat_control = self.rad_connection.get_object(
-                    kstat.Control())
-        except Exception as ex:
-            reason = _("Unable to obtain RAD object: %s") % ex
-            raise exception.NovaException(reason)
+    def zone_manager(self):
+        return self._get_rad_object(zonemgr.ZoneManager)
 
-        return self._kstat_control
+    @property
+    def kstat_control(self):
+        return self._get_rad_object(kstat.Control)
 
     @property
     def archive_manager(self):
-        try:
-            if (self._archive_manager is None or
-                    self._archive_manager._conn._closed is not None):
-                self._archive_manager = self.rad_connection.get_object(
-                    archivemgr.ArchiveManager())
-        except Exception as ex:
-            reason = _("Unable to obtain RAD object: %s") % ex
-            raise exception.NovaException(reason)
-
-        return self._archive_manager
+        return self._get_rad_object(archivemgr.ArchiveManager)
 
     @property
     def be_manager(self):
-        try:
-            if (self._be_manager is None or
-                    self._be_manager._conn._closed is not None):
-                self._be_manager = self.rad_connection.get_object(
-                    bemgr.BEManager())
-        except Exception as ex:
-            reason = _("Unable to obtain RAD object: %s") % ex
-            raise exception.NovaException(reason)
-
-        return self._be_manager
+        return self._get_rad_object(bemgr.BEManager)
 
     def plug_vifs(self, instance, network_info):
         if network_info:
@@ -318,72 +506,59 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
     def _get_fc_hbas(self):
         """Get Fibre Channel HBA information."""
-        if self._fc_hbas:
+        if (self._fc_hbas is not None and
+                time.monotonic() - self._fc_hbas_time < FC_HBA_CACHE_TTL):
             return self._fc_hbas
 
         out = None
         try:
             out, err = processutils.execute('/usr/sbin/fcinfo', 'hba-port')
         except processutils.ProcessExecutionError:
+            self._fc_hbas = None
+            self._fc_hbas_time = 0
+            self._fc_online_wwnns = []
+            self._fc_online_wwpns = []
             return []
 
         if out is None:
             raise RuntimeError(_("Cannot find any Fibre Channel HBAs"))
 
+        # Collect the following hba-port data for every Initiator mode port:
+        # 1: Port WWN
+        # 2: State (online|offline)
+        # 3: Node WWN
+        # The node and port names of the online ports are kept alongside so
+        # that _get_fc_wwnns() and _get_fc_wwpns() do not have to walk the
+        # HBA list again.
         hbas = []
-        hba = {}
-        for line in out.splitlines():
-            line = line.strip()
-            # Collect the following hba-port data:
-            # 1: Port WWN
-            # 2: State (online|offline)
-            # 3: Node WWN
-            if line.startswith("HBA Port WWN:"):
-                # New HBA port entry
-                hba = {}
-                wwpn = line.split()[-1]
-                hba['port_name'] = wwpn
-                continue
-            elif line.startswith("Port Mode:"):
-                mode = line.split()[-1]
-                # Skip Target mode ports
-                if mode != 'Initiator':
-                    break
-            elif line.startswith("State:"):
-                state = line.split()[-1]
-                hba['port_state'] = state
+        online_wwnns = []
+        online_wwpns = []
+        for match in _FCINFO_HBA_RE.finditer(out):
+            wwpn, mode, state, wwnn = match.groups()
+            # Skip Target mode ports
+            if mode != 'Initiator':
                 continue
-            elif line.startswith("Node WWN:"):
-                wwnn = line.split()[-1]
-                hba['node_name'] = wwnn
-                continue
-            if len(hba) == 3:
-                hbas.append(hba)
-                hba = {}
+            hbas.append({'port_name': wwpn,
+                         'port_state': state,
+                         'node_name': wwnn})
+            if state == 'online':
+                online_wwnns.append(wwnn)
+                online_wwpns.append(wwpn)
         self._fc_hbas = hbas
+        self._fc_online_wwnns = online_wwnns
+        self._fc_online_wwpns = online_wwpns
+        self._fc_hbas_time = time.monotonic()
         return self._fc_hbas
 
     def _get_fc_wwnns(self):
         """Get Fibre Channel WWNNs from the system, if any."""
-        hbas = self._get_fc_hbas()
-
-        wwnns = []
-        for hba in hbas:
-            if hba['port_state'] == 'online':
-                wwnn = hba['node_name']
-                wwnns.append(wwnn)
-        return wwnns
+        self._get_fc_hbas()
+        return self._fc_online_wwnns[:]
 
     def _get_fc_wwpns(self):
         """Get Fibre Channel WWPNs from the system, if any."""
-        hbas = self._get_fc_hbas()
-
-        wwpns = []
-        for hba in hbas:
-            if hba['port_state'] == 'online':
-                wwpn = hba['port_name']
-                wwpns.append(wwpn)
-        return wwpns
+        self._get_fc_hbas()
+        return self._fc_online_wwpns[:]
 
     def _get_iscsi_initiator(self):
         """ Return the iSCSI initiator node name IQN for this host """
@@ -401,15 +576,40 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
     def _get_zone_by_name(self, name):
         """Return a Solaris Zones object via RAD by name."""
+        # Zones found recently are reused for a short while, as the same zone
+        # tends to be looked up many times in a row by the compute manager.
+        ttl = CONF.solariszones.zone_lookup_cache_ttl
+        conn = self._ensure_rad()
+        cached = self._zone_cache.get(name)
+        if cached is not None:
+            timestamp, gen, zone = cached
+            if (time.monotonic() - timestamp < ttl and
+                    gen == self._rad_gen):
+                # The zone may have been deleted or migrated away since it
+                # was cached, in which case its object no longer resolves;
+                # look it up afresh rather than hand out a stale object.
+                try:
+                    if zone.name == name:
+                        return zone
+                except Exception:
+                    pass
+            self._zone_cache.pop(name, None)
+
         try:
-            zone = self.rad_connection.get_object(
+            zone = conn.get_object(
                 zonemgr.Zone(), rad.client.ADRGlobPattern({'name': name}))
         except rad.client.NotFoundError:
             return None
         except Exception:
             raise
+        if ttl > 0:
+            self._zone_cache[name] = (time.monotonic(), self._rad_gen, zone)
         return zone
 
+    def _invalidate_zone_cache(self, name):
+        """Forget any cached Solaris Zones object for the given name."""
+        self._zone_cache.pop(name, None)
+
     def _get_zpool_by_name(self, name):
         """Return a Solaris Zpool object via RAD by name."""
         try:
@@ -438,13 +638,27 @@ class SolarisZonesDriver(driver.ComputeDriver):
         LOG.debug('The active boot environment is %s', be.name)
         return self._get_zpool_by_name(be.zpool)
 
-    def _get_state(self, zone):
+    @staticmethod
+    def _get_state(zone):
         """Return the running state, one of the power_state codes."""
         return SOLARISZONES_POWER_STATE[zone.state]
 
+    def _cached_sysconf(self, name):
+        """Return os.sysconf(name), reusing the value for SYSCONF_CACHE_TTL
+        seconds. Used for values such as the number of online CPUs, which
+        only change on dynamic reconfiguration.
+        """
+        cached = self._sysconf_cache.get(name)
+        now = time.monotonic()
+        if cached is not None and now - cached[0] < SYSCONF_CACHE_TTL:
+            return cached[1]
+        value = os.sysconf(name)
+        self._sysconf_cache[name] = (now, value)
+        return value
+
     def _pages_to_kb(self, pages):
         """Convert a number of pages of memory into a total size in KBytes."""
-        return (pages * self._pagesize) / units.Ki
+        return pages * self._pages_to_kb_factor
 
     def _get_max_mem(self, zone):
         """Return the maximum memory in KBytes allowed."""
@@ -455,12 +669,12 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
         max_mem = utils.lookup_resource_property(zone, 'capped-memory', mem_resource)
         if max_mem is not None:
-            return strutils.string_to_bytes("%sB" % max_mem) / units.Ki
+            return _parse_size_kb(max_mem)
 
         # If physical property in capped-memory doesn't exist, this may
         # represent a non-global zone so just return the system's total
         # memory.
-        return self._pages_to_kb(os.sysconf('SC_PHYS_PAGES'))
+        return self._pages_to_kb(self._sc_phys_pages)
 
     def _get_mem(self, zone):
         """Return the memory in KBytes used by the domain."""
@@ -484,27 +698,47 @@ class SolarisZonesDriver(driver.ComputeDriver):
         # CPUs defined there.
         ncpus = utils.lookup_resource_property(zone, 'virtual-cpu', 'ncpus')
         if ncpus is not None:
-            min = ncpus.split('-', 1)[0]
-            if min.isdigit():
-                return int(min)
+            low, _high = _parse_cpu_range(ncpus)
+            if low is not None:
+                return low
 
         # Otherwise if a 'dedicated-cpu' resource exists, use the maximum
         # number of CPUs defined there.
         ncpus = utils.lookup_resource_property(zone, 'dedicated-cpu', 'ncpus')
         if ncpus is not None:
-            max = ncpus.split('-', 1)[-1]
-            if max.isdigit():
-                return int(max)
+            _low, high = _parse_cpu_range(ncpus)
+            if high is not None:
+                return high
 
         # Finally if neither resource exists but the zone was assigned a
         # pool in the configuration, the number of CPUs would be the size
         # of the processor set. Currently there's no way of easily
         # determining this so use the system's notion of the total number
         # of online CPUs.
-        return os.sysconf('SC_NPROCESSORS_ONLN')
+        return self._cached_sysconf('SC_NPROCESSORS_ONLN')
 
     def _kstat_data(self, uri):
         """Return Kstat snapshot data via RAD as a dictionary."""
+        return self._kstat_fetch(uri, update=True)
+
+    def _kstat_data_batch(self, uris):
+        """Return Kstat snapshot data via RAD for each of the given URIs,
+        updating the kstat chain only once for all of them. A URI whose
+        data could not be retrieved has None in its place.
+        """
+        try:
+            self.kstat_control.update()
+        except Exception as reason:
+            LOG.warning(_("Unable to update kstat chain via kstat(3RAD): %s")
+                        % reason)
+            return [None] * len(uris)
+
+        return [self._kstat_fetch(uri) for uri in uris]
+
+    def _kstat_fetch(self, uri, update=False):
+        """Return Kstat snapshot data via RAD as a dictionary, only refreshing
+        the kstat chain first if update is True.
+        """
         if not isinstance(uri, str):
             raise exception.NovaException("kstat URI must be string type: "
                                           "%s is %s" % (uri, type(uri)))
@@ -513,9 +747,10 @@ class SolarisZonesDriver(driver.ComputeDriver):
             uri = "kstat:/" + uri
 
         try:
-            self.kstat_control.update()
+            if update:
+                self.kstat_control.update()
             kstat_obj = self.rad_connection.get_object(
-                kstat.Kstat(), rad.client.ADRGlobPattern({"uri": uri}))
+                kstat.Kstat(), _kstat_uri_pattern(uri))
 
         except Exception as reason:
             LOG.warning(_("Unable to retrieve kstat object '%s' via kstat(3RAD): "
@@ -543,6 +778,17 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
         return total
 
+    def _sum_kstat_int(self, kstat_data, statistic):
+        """Sum an integer typed statistic over a dictionary of kstats.
+
+        This is a cheaper version of _sum_kstat_statistic for statistics
+        known to be of NVVT_INT type, such as the cpu_nsec_*_cur ones.
+        """
+        total = 0
+        for ks in kstat_data.values():
+            total += ks.getMap()[statistic].integer
+        return total
+
     def _get_kstat_statistic(self, ks, statistic):
         if not isinstance(ks, kstat.Kstat):
             reason = (_("Attempted to get a kstat from %s type.") % (type(ks)))
@@ -570,12 +816,15 @@ class SolarisZonesDriver(driver.ComputeDriver):
         # often, but if we do it should resolve quickly so try again"+1
         # algorithm.
         uri = "kstat:/zones/%s/cpu" % zone.name
-        accum_uri = "kstat:/zones/%s/cpu/accum/sys" % zone.name
+        cpu_uri_prefix = uri + "/"
+        accum_uri = cpu_uri_prefix + "accum/sys"
         for _attempt in range(3):
             total = 0
 
-            initial = self._kstat_data(accum_uri)
-            cpus = self._kstat_data(uri)
+            # Refresh the kstat chain once per attempt; the remaining reads
+            # in this attempt all use that snapshot.
+            initial = self._kstat_fetch(accum_uri, update=True)
+            cpus = self._kstat_fetch(uri)
             if cpus is None:
                 # If the zone state is not running then give up but if it is
                 # running try again.
@@ -586,22 +835,25 @@ class SolarisZonesDriver(driver.ComputeDriver):
             cpus.pop('pset_accum')
             cpus.pop('accum')
 
+            # Let other greenthreads run before the per-cpu RAD calls.
+            greenthread.sleep(0)
+
             cpu = None
             for n in cpus:
-                cpu = self._kstat_data(uri + "/%s" % n)
+                cpu = self._kstat_fetch(cpu_uri_prefix + n)
                 if cpu is None:
                     if zone.state != ZONE_STATE_RUNNING:
                         return 0
                     else:
                         break
 
-                total += self._sum_kstat_statistic(cpu, 'cpu_nsec_kernel_cur')
-                total += self._sum_kstat_statistic(cpu, 'cpu_nsec_user_cur')
+                total += self._sum_kstat_int(cpu, 'cpu_nsec_kernel_cur')
+                total += self._sum_kstat_int(cpu, 'cpu_nsec_user_cur')
 
             if cpu is None:
                 continue
 
-            final = self._kstat_data(accum_uri)
+            final = self._kstat_fetch(accum_uri)
             if final is None:
                 continue
 
@@ -625,13 +877,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
         zone = self._get_zone_by_name(name)
         if zone is None:
             raise exception.InstanceNotFound(instance_id=name)
-        return hardware.InstanceInfo(state=self._get_state(zone),
-                                     internal_id=instance.uuid)
-#        return hardware.InstanceInfo(state=self._get_state(zone),
-#                                     max_mem_kb=self._get_max_mem(zone),
-#                                     mem_kb=self._get_mem(zone),
-#                                     num_cpu=self._get_num_cpu(zone),
-#                                     cpu_time_ns=self._get_cpu_time(zone))
+        state = self._get_state(zone)
+        return hardware.InstanceInfo(state=state, internal_id=instance.uuid)
 
     def get_num_instances(self):
         LOG.debug("get_num_instances")
@@ -651,25 +898,14 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
     def instance_exists(self, instance):
         LOG.debug("instance_exists")
-        return instance.name in self.list_instances()
         """Checks existence of an instance on the host.
 
         :param instance: The instance to lookup
 
         Returns True if an instance with the supplied ID exists on
         the host, False otherwise.
-
-        .. note::
-
-            This implementation works for all drivers, but it is
-            not particularly efficient. Maintainers of the virt drivers are
-            encouraged to override this method with something more
-            efficient.
         """
-#        try:
-#            return instance.uuid in self.list_instance_uuids()
-#        except NotImplementedError:
-#            return instance.name in self.list_instances()
+        return self._get_zone_by_name(instance.name) is not None
 
     def estimate_instance_overhead(self, instance_info):
         LOG.debug("estimate_instance_overhead")
@@ -685,8 +921,10 @@ class SolarisZonesDriver(driver.ComputeDriver):
         return {'memory_mb': 0}
 
     def _get_list_zone_object(self):
-        """Return a list of all Solaris Zones objects via RAD."""
-        return self.rad_connection.list_objects(zonemgr.Zone())
+        """Yield the ADR names of all Solaris Zones objects, as listed by a
+        single RAD call.
+        """
+        yield from self.rad_connection.list_objects(zonemgr.Zone())
 
     def list_instances(self):
         LOG.debug("list_instances")
@@ -694,9 +932,18 @@ class SolarisZonesDriver(driver.ComputeDriver):
         layer, as a list.
         """
         # TODO(Vek): Need to pass context in for access to auth_token
+        # The zone name is one of the keys of the ADR name returned by the
+        # listing, so there is no need to fetch every Zone object from RAD.
         instances_list = []
-        for zone in self._get_list_zone_object():
-            instances_list.append(self.rad_connection.get_object(zone).name)
+        for count, zone in enumerate(self._get_list_zone_object(), 1):
+            name = utils.lookup_adr_name_key(zone, 'name')
+            if name is None:
+                name = self.rad_connection.get_object(zone).name
+            instances_list.append(name)
+            # RAD calls block the whole process, so let other greenthreads
+            # run every now and then on hosts with many zones.
+            if count % RAD_YIELD_INTERVAL == 0:
+                greenthread.sleep(0)
         LOG.debug("instance list %s", instances_list)
         return instances_list
 
@@ -711,11 +958,22 @@ class SolarisZonesDriver(driver.ComputeDriver):
         root_ci = None
         rootmp = instance['root_device_name']
         for entry in bdms:
-            if entry['connection_info'] is None:
+            connection_info = entry['connection_info']
+            if connection_info is None:
+                continue
+
+            is_root = entry['device_name'] == rootmp
+            if not is_root and recreate:
                 continue
 
-            if entry['device_name'] == rootmp:
-                root_ci = jsonutils.loads(entry['connection_info'])
+            # Parse the connection_info once per entry, and only if it has
+            # not already been deserialized.
+            if not isinstance(connection_info, dict):
+                connection_info = jsonutils.loads(connection_info)
+
+            if is_root:
+                # Copy so repairing the serial below does not alter the bdm.
+                root_ci = dict(connection_info)
                 # Let's make sure this is a well formed connection_info, by
                 # checking if it has a serial key that represents the
                 # volume_id. If not check to see if the block device has a
@@ -735,9 +993,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
                 continue
 
-            if not recreate:
-                ci = jsonutils.loads(entry['connection_info'])
-                self.detach_volume(ci, instance, entry['device_name'])
+            self.detach_volume(context, connection_info, instance,
+                               entry['device_name'])
 
         if root_ci is None and recreate:
             msg = (_("Unable to find the root device for instance '%s'.")
@@ -809,8 +1066,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
         if recreate:
             instance.system_metadata['evac_from'] = instance['launched_on']
             instance.save()
-            extra_specs = self._get_flavor(instance)['extra_specs'].copy()
-            brand = extra_specs.get('zonecfg:brand', ZONE_BRAND_SOLARIS)
+            brand = self._get_brand(instance)
             if brand == ZONE_BRAND_SOLARIS:
                 msg = (_("'%s' branded zones do not currently support "
                          "evacuation.") % brand)
@@ -846,10 +1102,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
                 rootdevname = block_device_info.get('root_device_name')
                 if rootdevname is not None:
                     bdi_bdms = block_device_info.get('block_device_mapping')
-                    for entry in bdi_bdms:
-                        if entry['mount_device'] == rootdevname:
-                            bdi_bdms.remove(entry)
-                            break
+                    bdi_bdms[:] = [entry for entry in bdi_bdms
+                                   if entry['mount_device'] != rootdevname]
 
         instance.task_state = task_states.REBUILD_SPAWNING
         instance.save(
@@ -858,8 +1112,6 @@ class SolarisZonesDriver(driver.ComputeDriver):
         # Instead of using a boolean for 'rebuilding' scratch data, use a
         # string because the object will translate it to a string anyways.
         if recreate:
-            extra_specs = self._get_flavor(instance)['extra_specs'].copy()
-
             instance.system_metadata['rebuilding'] = 'false'
             self._create_config(context, instance, network_info, root_ci, None)
             del instance.system_metadata['evac_from']
@@ -878,23 +1130,24 @@ class SolarisZonesDriver(driver.ComputeDriver):
         if recreate:
             zone.attach(['-x', 'initialize-hostdata'])
 
+            # Each attach edits and applies the zone configuration, so the
+            # volumes are attached one at a time rather than concurrently.
             rootmp = instance['root_device_name']
-            for entry in bdms:
-                if (entry['connection_info'] is None or
-                        rootmp == entry['device_name']):
-                    continue
-
-                connection_info = jsonutils.loads(entry['connection_info'])
-                mount = entry['device_name']
+            volumes = [(jsonutils.loads(entry['connection_info']),
+                        entry['device_name'])
+                       for entry in bdms
+                       if (entry['connection_info'] is not None and
+                           rootmp != entry['device_name'])]
+            for connection_info, mount in volumes:
                 self.attach_volume(context, connection_info, instance, mount)
 
             self._power_on(instance, network_info)
 
         if admin_password is not None:
             # Because there is no way to make sure a zone is ready upon
-            # returning from a boot request. We must give the zone a few
-            # seconds to boot before attempting to set the admin password.
-            greenthread.sleep(15)
+            # returning from a boot request. We must wait for the zone to
+            # boot far enough before attempting to set the admin password.
+            self._wait_for_zone_login(zone)
             self.set_admin_password(instance, admin_password)
 
     def _get_flavor(self, instance):
@@ -905,44 +1158,88 @@ class SolarisZonesDriver(driver.ComputeDriver):
 #            instance['instance_type_id'])
         return instance.flavor
 
+    def _get_extra_specs(self, instance):
+        """Return a read-only view of the flavor extra specs of the instance.
+
+        The view is reused until the instance's flavor changes or the
+        instance is destroyed.
+        """
+        flavor = instance.flavor
+        cached = self._extra_specs_cache.get(instance.uuid)
+        if cached is not None and cached[0] == flavor.id:
+            return cached[1]
+        extra_specs = types.MappingProxyType(dict(flavor.extra_specs))
+        self._extra_specs_cache[instance.uuid] = (flavor.id, extra_specs)
+        return extra_specs
+
+    def _get_brand(self, instance):
+        """Return the zone brand of the instance, as set by the
+        'zonecfg:brand' extra spec of its flavor.
+        """
+        return self._get_extra_specs(instance).get('zonecfg:brand',
+                                                   ZONE_BRAND_SOLARIS)
+
     def _fetch_image(self, context, instance):
         """Fetch an image using Glance given the instance's image_ref."""
         glancecache_dirname = CONF.solariszones.glancecache_dirname
-        fileutils.ensure_tree(glancecache_dirname)
         iref = instance['image_ref']
         LOG.debug('Downloading image %s' % iref)
         image = os.path.join(glancecache_dirname, iref)
         downloading = image + '.downloading'
 
-        with lockutils.lock('glance-image-%s' % iref):
-            if os.path.isfile(downloading):
-                LOG.debug(_('Cleaning partial download of %s' % iref))
-                os.unlink(downloading)
+        # The image only appears under its final name once it has been
+        # completely downloaded, so a cached copy can be used without
+        # waiting for the lock.
+        if os.path.exists(image):
+            LOG.debug(_("Using existing, cached Glance image: id %s") % iref)
+            return image
 
-            elif os.path.exists(image):
+        fileutils.ensure_tree(glancecache_dirname)
+        with lockutils.lock('glance-image-%s' % iref):
+            # Another request may have fetched the image while this one was
+            # waiting for the lock.
+            if os.path.exists(image):
                 LOG.debug(_("Using existing, cached Glance image: id %s")
                           % iref)
                 return image
 
+            try:
+                os.unlink(downloading)
+                LOG.debug(_('Cleaning partial download of %s' % iref))
+            except FileNotFoundError:
+                pass
+
             LOG.debug(_("Fetching new Glance image: id %s") % iref)
             try:
                 # No trusted_certs for now
                 images.fetch(context, iref, downloading)
-                os.rename(downloading, image)
+                os.replace(downloading, image)
                 return image
             except Exception as reason:
                 LOG.exception(_("Unable to fetch Glance image: id %s: %s")
                               % (iref, reason))
                 raise
 
-    @lockutils.synchronized('validate_image')
     def _validate_image(self, context, image, instance):
         LOG.debug('Validate image %s' % image)
         """Validate a glance image for compatibility with the instance."""
         # Skip if the image was already checked and confirmed as valid.
-        if instance['image_ref'] in self._validated_archives:
+        iref = instance['image_ref']
+        if iref in self._validated_archives:
             return
 
+        # Serialize validation per image only, so that spawns of different
+        # images do not wait on each other. Check again under the lock in
+        # case another spawn validated the same image in the meantime.
+        with lockutils.lock('validate-image-%s' % iref):
+            if iref in self._validated_archives:
+                return
+            self._validate_archive(context, image, instance)
+
+    def _validate_archive(self, context, image, instance):
+        """Check the Unified Archive of a glance image and record it as
+        validated if it is compatible with this compute host.
+        """
         try:
             ua = self.archive_manager.getArchive(image)
         except Exception as ex:
@@ -962,7 +1259,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
                                               reason=reason)
         # - matching architecture
         deployable_arch = str(ua.isa)
-        compute_arch = platform.processor()
+        compute_arch = self._compute_arch
         if deployable_arch.lower() != compute_arch:
             reason = (_("Unified Archive architecture '%s' is incompatible "
                       "with this compute host's architecture, '%s'.")
@@ -987,13 +1284,12 @@ class SolarisZonesDriver(driver.ComputeDriver):
             raise exception.ImageUnacceptable(image_id=instance['image_ref'],
                                               reason=reason)
         # - looks like it's OK
-        self._validated_archives.append(instance['image_ref'])
+        self._validated_archives.add(instance['image_ref'])
 
     def _validate_flavor(self, instance):
         """Validate the flavor for compatibility with zone brands"""
         flavor = self._get_flavor(instance)
-        extra_specs = flavor['extra_specs'].copy()
-        brand = extra_specs.get('zonecfg:brand', ZONE_BRAND_SOLARIS)
+        brand = self._get_brand(instance)
 
         if brand == ZONE_BRAND_SOLARIS_KZ:
             # verify the memory is 256mb aligned
@@ -1040,12 +1336,11 @@ class SolarisZonesDriver(driver.ComputeDriver):
                                                     '-t', 'iscsi',
                                                     '-p', 'target=%s' % target,
                                                     '-p', 'lun=%s' % target_lun)
-                    for line in [l.strip() for l in out.splitlines()]:
-                        if "luname.naa." in line:
-                            LOG.debug(_("The found luname-only URI for the "
-                                      "LUN '%s' is '%s'.") %
-                                      (target_lun, line))
-                            suri = line
+                    found = _ISCSI_LUNAME_URI_RE.findall(out)
+                    if found:
+                        suri = found[-1]
+                        LOG.debug(_("The found luname-only URI for the "
+                                  "LUN '%s' is '%s'.") % (target_lun, suri))
                 except processutils.ProcessExecutionError as ex:
                     reason = ex.stderr
                     LOG.debug(_("Failed to lookup-uri for volume '%s', lun "
@@ -1081,10 +1376,17 @@ class SolarisZonesDriver(driver.ComputeDriver):
             # If the volume was exported just a few seconds previously then
             # it will probably not be visible to the local adapter yet.
             # Invoke 'fcinfo remote-port' on all local HBA ports to trigger
-            # a refresh.
-            for wwpn in self._get_fc_wwpns():
-                processutils.execute('/usr/sbin/fcinfo',
-                                     'remote-port', '-p', wwpn)
+            # a refresh. fcinfo only takes a single local port per call, so
+            # run one per port concurrently.
+            wwpns = self._get_fc_wwpns()
+            if wwpns:
+                pool = greenpool.GreenPool(len(wwpns))
+                for _out in pool.imap(
+                        functools.partial(processutils.execute,
+                                          '/usr/sbin/fcinfo', 'remote-port',
+                                          '-p'),
+                        wwpns):
+                    pass
 
             suri = self._lookup_fc_volume_suri(target_wwn, target_lun)
         return suri
@@ -1097,52 +1399,81 @@ class SolarisZonesDriver(driver.ComputeDriver):
         else:
             wwns.append(target_wwn)
 
+        # suriadm only looks up a single target per call, so probe all of
+        # the target WWNs concurrently and only wait before retrying if
+        # none of them resolved.
+        probe = functools.partial(self._probe_fc_volume_suri,
+                                  target_lun=target_lun)
+        pool = greenpool.GreenPool(len(wwns))
         for _none in range(3):
-            for wwn in wwns:
-                try:
-                    out, err = processutils.execute('/usr/sbin/suriadm', 'lookup-uri',
-                                                    '-p', 'target=naa.%s' % wwn,
-                                                    '-p', 'lun=%s' % target_lun)
-                    for line in [l.strip() for l in out.splitlines()]:
-                        if line.startswith("lu:luname.naa."):
-                            return line
-                except processutils.ProcessExecutionError as ex:
-                    reason = ex.stderr
-                    LOG.debug(_("Failed to lookup-uri for volume '%s', lun "
-                              "%s: %s") % (wwn, target_lun, reason))
+            for suri in pool.imap(probe, wwns):
+                if suri is not None:
+                    return suri
             greenthread.sleep(2)
         else:
             msg = _("Unable to lookup URI of Fibre Channel volume "
                     "with lun '%s'." % target_lun)
             raise exception.InvalidVolume(reason=msg)
 
-    def _set_global_properties(self, name, extra_specs, brand):
-        """Set Solaris Zone's global properties if supplied via flavor."""
-        zone = self._get_zone_by_name(name)
+    def _probe_fc_volume_suri(self, wwn, target_lun):
+        """Return the LU based URI of the FC LU on the given target, or None
+        if it could not be looked up.
+        """
+        try:
+            out, err = processutils.execute('/usr/sbin/suriadm', 'lookup-uri',
+                                            '-p', 'target=naa.%s' % wwn,
+                                            '-p', 'lun=%s' % target_lun)
+        except processutils.ProcessExecutionError as ex:
+            reason = ex.stderr
+            LOG.debug(_("Failed to lookup-uri for volume '%s', lun "
+                      "%s: %s") % (wwn, target_lun, reason))
+            return None
+        match = _FC_LUNAME_URI_RE.search(out)
+        return match.group(1) if match is not None else None
+
+    def _require_zone(self, name, zone=None):
+        """Return zone if the caller already has it, otherwise look the zone
+        up by name. Raises InstanceNotFound if there is no such zone.
+        """
         if zone is None:
-            raise exception.InstanceNotFound(instance_id=name)
+            zone = self._get_zone_by_name(name)
+            if zone is None:
+                raise exception.InstanceNotFound(instance_id=name)
+        return zone
 
-        # TODO(dcomay): Should figure this out via the brands themselves.
-        zonecfg_items = [
-            'bootargs',
-            'brand',
-            'hostid'
-        ]
+    @contextlib.contextmanager
+    def _zone_txn(self, name, zc=None, zone=None):
+        """Yield a ZoneConfig for the named zone.
+
+        If zc is given, the changes are made as part of that configuration
+        edit and committed along with it; otherwise a new one is opened and
+        committed on exit.
+        """
+        if zc is not None:
+            yield zc
+            return
+
+        zone = self._require_zone(name, zone)
+        with ZoneConfig(zone) as zc:
+            yield zc
+
+    def _set_global_properties(self, name, extra_specs, brand, zc=None):
+        """Set Solaris Zone's global properties if supplied via flavor."""
         if brand == ZONE_BRAND_SOLARIS:
-            zonecfg_items.extend(
-                ['file-mac-profile', 'fs-allowed', 'limitpriv'])
+            zonecfg_items = ZONECFG_GLOBAL_PROPS_SOLARIS
         else:
-            zonecfg_items.extend(['cpu-arch'])
+            zonecfg_items = ZONECFG_GLOBAL_PROPS_OTHER
+
+        # Only consider zonecfg-scoped properties, and ignore the 'brand'
+        # property if present.
+        props = [(key[len('zonecfg:'):], value)
+                 for key, value in extra_specs.items()
+                 if key.startswith('zonecfg:') and key != 'zonecfg:brand']
+        if not props:
+            return
 
-        with ZoneConfig(zone) as zc:
-            for key, value in extra_specs.items():
-                # Ignore not-zonecfg-scoped brand properties.
-                if not key.startswith('zonecfg:'):
-                    continue
-                _scope, prop = key.split(':', 1)
-                # Ignore the 'brand' property if present.
-                if prop == 'brand':
-                    continue
+        with self._zone_txn(name, zc) as zc:
+            for prop, value in props:
                 # Ignore but warn about unsupported zonecfg-scoped properties.
                 if prop not in zonecfg_items:
                     LOG.warning(_("Ignoring unsupported zone property '%s' "
@@ -1151,6 +1482,29 @@ class SolarisZonesDriver(driver.ComputeDriver):
                     continue
                 zc.setprop('global', prop, value)
 
+    def _wait_for_volume_create(self, context, volume_id):
+        """Poll the volume service until the volume is no longer being
+        created, backing off between polls, and return the volume.
+        """
+        # TODO(npower): Polling is what nova/compute/manager also does when
+        # creating a new volume, so we do likewise here.
+        timeout = CONF.solariszones.volume_create_timeout
+        deadline = time.monotonic() + timeout
+        delay = VOLUME_POLL_INTERVAL
+        attempts = 0
+        while True:
+            volume = self._volume_api.get(context, volume_id)
+            attempts += 1
+            if volume['status'] != 'creating':
+                return volume
+            if time.monotonic() >= deadline:
+                raise exception.VolumeNotCreated(volume_id=volume_id,
+                                                 seconds=timeout,
+                                                 attempts=attempts,
+                                                 volume_status='creating')
+            greenthread.sleep(delay)
+            delay = min(delay * 2, VOLUME_POLL_INTERVAL_MAX)
+
     def _create_boot_volume(self, context, instance):
         """Create a (Cinder) volume service backed boot volume"""
         LOG.debug('Creating boot volume')
@@ -1163,20 +1517,15 @@ class SolarisZonesDriver(driver.ComputeDriver):
                 "Boot volume for instance '%s' (%s)"
                 % (instance['name'], instance['uuid']),
                 volume_type=boot_vol_type, availability_zone=boot_vol_az)
-            # TODO(npower): Polling is what nova/compute/manager also does when
-            # creating a new volume, so we do likewise here.
-            while True:
-                volume = self._volume_api.get(context, vol['id'])
-                if volume['status'] != 'creating':
-                    return volume
-                greenthread.sleep(1)
+            return self._wait_for_volume_create(context, vol['id'])
 
         except Exception as reason:
             LOG.exception(_("Unable to create root zpool volume for instance "
                             "'%s': %s") % (instance['name'], reason))
             raise
 
-    def _connect_boot_volume(self, volume, mountpoint, context, instance):
+    def _connect_boot_volume(self, volume, mountpoint, context, instance,
+                             brand=None):
         """Connect a (Cinder) volume service backed boot volume"""
         LOG.debug('Connecting boot volume')
         instance_uuid = instance['uuid']
@@ -1191,8 +1540,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
         # local to this compute node. If it is, then don't use it for
         # Solaris branded zones in order to avoid a known ZFS deadlock issue
         # when using a zpool within another zpool on the same system.
-        extra_specs = self._get_flavor(instance)['extra_specs'].copy()
-        brand = extra_specs.get('zonecfg:brand', ZONE_BRAND_SOLARIS)
+        if brand is None:
+            brand = self._get_brand(instance)
         if brand == ZONE_BRAND_SOLARIS:
             driver_type = connection_info['driver_volume_type']
             if driver_type == 'local':
@@ -1233,16 +1582,14 @@ class SolarisZonesDriver(driver.ComputeDriver):
         self._volume_api.attach(context, volume_id, instance_uuid, mountpoint)
         return connection_info
 
-    def _set_boot_device(self, name, connection_info, brand, mountpoint=None):
+    def _set_boot_device(self, name, connection_info, brand, mountpoint=None,
+                         zone=None, zc=None, suri=None):
         LOG.debug("_set_boot_device")
         """Set the boot device specified by connection_info"""
-        zone = self._get_zone_by_name(name)
-        if zone is None:
-            raise exception.InstanceNotFound(instance_id=name)
-
-        suri = self._suri_from_volume_info(connection_info)
+        if suri is None:
+            suri = self._suri_from_volume_info(connection_info)
 
-        with ZoneConfig(zone) as zc:
+        with self._zone_txn(name, zc, zone) as zc:
             # ZOSS device configuration is different for the solaris-kz brand
             if brand == ZONE_BRAND_SOLARIS_KZ:
                 if mountpoint is None:
@@ -1263,15 +1610,11 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
         return os.path.join("/var/share/nova/configdrives", cd_name)
 
-    def _set_configdrive(self, name, instance, sc_dir):
+    def _set_configdrive(self, name, instance, sc_dir, zone=None, zc=None):
         """Set the configdrive device"""
-        zone = self._get_zone_by_name(name)
-        if zone is None:
-            raise exception.InstanceNotFound(instance_id=name)
-
         cd_path = self._get_configdrive_path(instance)
 
-        with ZoneConfig(zone) as zc:
+        with self._zone_txn(name, zc, zone) as zc:
             storagepath = "file://root:root@" + cd_path
             zc.addresource("device", [zonemgr.Property(
                 "storage", storagepath)
@@ -1300,12 +1643,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
         os.remove(cd_path)
 
-    def _set_num_cpu(self, name, vcpus, brand):
+    def _set_num_cpu(self, name, vcpus, brand, zc=None):
         """Set number of VCPUs in a Solaris Zone configuration."""
-        zone = self._get_zone_by_name(name)
-        if zone is None:
-            raise exception.InstanceNotFound(instance_id=name)
-
         # The Solaris Zone brand type is used to specify the type of
         # 'cpu' resource set in the Solaris Zone configuration.
         if brand == ZONE_BRAND_SOLARIS:
@@ -1315,15 +1654,11 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
         # TODO(dcomay): Until 17881862 is resolved, this should be turned into
         # an appropriate 'rctl' resource for the 'capped-cpu' case.
-        with ZoneConfig(zone) as zc:
+        with self._zone_txn(name, zc) as zc:
             zc.setprop(vcpu_resource, 'ncpus', str(vcpus))
 
-    def _set_memory_cap(self, name, memory_mb, brand):
+    def _set_memory_cap(self, name, memory_mb, brand, zc=None):
         """Set memory cap in a Solaris Zone configuration."""
-        zone = self._get_zone_by_name(name)
-        if zone is None:
-            raise exception.InstanceNotFound(instance_id=name)
-
         # The Solaris Zone brand type is used to specify the type of
         # 'memory' cap set in the Solaris Zone configuration.
         if brand == ZONE_BRAND_SOLARIS:
@@ -1331,30 +1666,35 @@ class SolarisZonesDriver(driver.ComputeDriver):
         else:
             mem_resource = 'physical'
 
-        with ZoneConfig(zone) as zc:
+        with self._zone_txn(name, zc) as zc:
             zc.setprop('capped-memory', mem_resource, '%dM' % memory_mb)
 
     def _plug_vifs(self, instance, network_info):
-        LOG.debug("_plug_vifs instance: %s, network info: %s",
-                  instance, network_info)
-        return
+        """VIFs are plumbed by the zone's anet resources, so there is
+        nothing to do here.
+        """
+        pass
 
     def _unplug_vifs(self, instance):
-        LOG.debug("_unplug_vifs instance: %s", instance)
-        return
+        """VIFs are unplumbed along with the zone's anet resources, so there
+        is nothing to do here.
+        """
+        pass
 
-    def _set_net_info(self, context, zone, brand, first_anet, vif):
-        # Need to be admin to retrieve provider:network_type attribute
-        network_plugin = neutron_api.get_client(context, admin=True)
-        network = network_plugin.show_network(
-            vif['network']['id'])['network']
+    def _set_net_info(self, context, zone, brand, first_anet, vif,
+                      network=None):
+        if network is None:
+            # Need to be admin to retrieve provider:network_type attribute
+            network_plugin = neutron_api.get_client(context, admin=True)
+            network = network_plugin.show_network(
+                vif['network']['id'])['network']
         network_type = network['provider:network_type']
         lower_link = None
         vlan_id = 0
         if network_type in ['vlan', 'flat']:
             physical_network = network['provider:physical_network']
 
-            vif_details = vif['details']
+            vif_details = vif.get('details', {})
             lower_link = vif_details.get(
                 network_model.VIF_DETAILS_PHYS_INTERFACE)
 
@@ -1415,11 +1755,9 @@ class SolarisZonesDriver(driver.ComputeDriver):
         pass
 
     def _set_network(self, context, name, instance, network_info, brand,
-                     sc_dir):
+                     sc_dir, zone=None):
         """add networking information to the zone."""
-        zone = self._get_zone_by_name(name)
-        if zone is None:
-            raise exception.InstanceNotFound(instance_id=name)
+        zone = self._require_zone(name, zone)
 
         if not network_info:
             with ZoneConfig(zone) as zc:
@@ -1430,41 +1768,43 @@ class SolarisZonesDriver(driver.ComputeDriver):
                     zc.removeresources("anet", [zonemgr.Property("id", "0")])
                 return
 
+        # Need to be admin to retrieve provider:network_type attribute.
+        # Look up the networks of all the VIFs concurrently rather than one
+        # after the other.
+        network_plugin = neutron_api.get_client(context, admin=True)
+        network_ids = [vif['network']['id'] for vif in network_info]
+        pool = greenpool.GreenPool(min(8, len(network_ids)))
+        networks = list(pool.imap(
+            lambda network_id: network_plugin.show_network(
+                network_id)['network'],
+            network_ids))
+
+        needs_sysconfig = self._needs_sysconfig(instance)
         for vifid, vif in enumerate(network_info):
             LOG.debug("%s", jsonutils.dumps(vif, indent=5))
 
-            ip = vif['network']['subnets'][0]['ips'][0]['address']
-            cidr = vif['network']['subnets'][0]['cidr']
+            subnet = vif['network']['subnets'][0]
+            ip = subnet['ips'][0]['address']
+            cidr = subnet['cidr']
             ip_cidr = "%s/%s" % (ip, cidr.split('/')[1])
-            ip_version = vif['network']['subnets'][0]['version']
-            dhcp_server = \
-                vif['network']['subnets'][0]['meta'].get('dhcp_server')
-            enable_dhcp = dhcp_server is not None
-            route = vif['network']['subnets'][0]['gateway']['address']
-            dns_list = vif['network']['subnets'][0]['dns']
-            nameservers = []
-            for dns in dns_list:
-                if dns['type'] == 'dns':
-                    nameservers.append(dns['address'])
+            ip_version = subnet['version']
+            enable_dhcp = subnet['meta'].get('dhcp_server') is not None
+            route = subnet['gateway']['address']
+            nameservers = [dns['address'] for dns in subnet['dns']
+                           if dns['type'] == 'dns']
 
             anetname = self._set_net_info(context, zone, brand, vifid == 0,
-                                          vif)
+                                          vif, networks[vifid])
 
             # create the required sysconfig file (or skip if this is part of a
             # resize or evacuate process)
-            tstate = instance['task_state']
-            if tstate not in [task_states.RESIZE_FINISH,
-                              task_states.RESIZE_REVERTING,
-                              task_states.RESIZE_MIGRATING,
-                              task_states.REBUILD_SPAWNING] or \
-                (tstate == task_states.REBUILD_SPAWNING and
-                 instance.system_metadata['rebuilding'] == 'true'):
+            if needs_sysconfig:
                 if enable_dhcp:
                     tree = sysconfig.create_ncp_defaultfixed('dhcp',
                                                              anetname, vifid,
                                                              ip_version)
                 else:
-                    host_routes = vif['network']['subnets'][0]['routes']
+                    host_routes = subnet['routes']
                     tree = sysconfig.create_ncp_defaultfixed('static',
                                                              anetname, vifid,
                                                              ip_version,
@@ -1488,14 +1828,21 @@ class SolarisZonesDriver(driver.ComputeDriver):
         with ZoneConfig(zone) as zc:
             zc.addresource('suspend', [zonemgr.Property('path', path)])
 
+    @staticmethod
+    def _needs_sysconfig(instance):
+        """Return True if SC profiles should be generated for the instance,
+        which is not the case while it is being resized or evacuated.
+        """
+        tstate = instance['task_state']
+        return (tstate not in SYSCONFIG_SKIP_TASK_STATES or
+                (tstate == task_states.REBUILD_SPAWNING and
+                 instance.system_metadata.get('rebuilding') == 'true'))
+
     def _verify_sysconfig(self, sc_dir, instance, admin_password=None):
         """verify the SC profile(s) passed in contain an entry for
         system/config-user to configure the root account.  If an SSH key is
         specified, configure root's profile to use it.
         """
-        def usercheck(e): return e.attrib.get('name') == 'system/config-user'
-        def hostcheck(e): return e.attrib.get('name') == 'system/identity'
-
         root_account_needed = True
         hostname_needed = True
         sshkey = instance.get('key_data')
@@ -1504,28 +1851,16 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
         # encrypt admin password, using SHA-256 as default
         if admin_password is not None:
-            encrypted_password = sha256_crypt.encrypt(admin_password)
-
-        # find all XML files in sc_dir
-        for root, dirs, files in os.walk(sc_dir):
-            for fname in [f for f in files if f.endswith(".xml")]:
-                fileroot = etree.parse(os.path.join(root, fname))
-
-                # look for config-user properties
-                if filter(usercheck, fileroot.findall('service')):
-                    # a service element was found for config-user.  Verify
-                    # root's password is set, the admin account name is set and
-                    # the admin's password is set
-                    pgs = fileroot.iter('property_group')
-                    for pg in pgs:
-                        if pg.attrib.get('name') == 'root_account':
-                            root_account_needed = False
-
-                # look for identity properties
-                if filter(hostcheck, fileroot.findall('service')):
-                    for props in fileroot.iter('propval'):
-                        if props.attrib.get('name') == 'nodename':
-                            hostname_needed = False
+            encrypted_password = PASSWORD_CONTEXT.hash(admin_password)
+
+        # find all XML files in sc_dir and look for the config-user
+        # root_account property group and the identity nodename property
+        for path in _xml_files(sc_dir):
+            root_account, nodename = _scan_sc_profile(path)
+            if root_account:
+                root_account_needed = False
+            if nodename:
+                hostname_needed = False
 
         # Verify all of the requirements were met.  Create the required SMF
         # profile(s) if needed.
@@ -1533,12 +1868,22 @@ class SolarisZonesDriver(driver.ComputeDriver):
             fp = os.path.join(sc_dir, 'config-root.xml')
 
             if admin_password is not None and sshkey is not None:
-                # store password for horizon retrieval
-                ctxt = nova_context.get_admin_context()
-                enc = crypto.ssh_encrypt_text(sshkey, admin_password)
-                instance.system_metadata.update(
-                    password.convert_password(ctxt, base64.b64encode(enc)))
-                instance.save()
+                # store password for horizon retrieval, unless this very
+                # key and password pair has already been stored.  The
+                # fingerprint is only kept in memory, never in the
+                # instance's metadata.
+                fingerprint = hashlib.sha256(
+                    (sshkey + admin_password).encode('utf-8')).hexdigest()[:16]
+                if (self._password_fingerprints.get(instance.uuid) !=
+                        fingerprint or
+                        'password_0' not in instance.system_metadata):
+                    ctxt = nova_context.get_admin_context()
+                    enc = crypto.ssh_encrypt_text(sshkey, admin_password)
+                    instance.system_metadata.update(
+                        password.convert_password(ctxt,
+                                                  base64.b64encode(enc)))
+                    instance.save()
+                    self._password_fingerprints[instance.uuid] = fingerprint
 
             if encrypted_password is not None or sshkey is not None:
                 # set up the root account as 'normal' with no expiration,
@@ -1562,14 +1907,16 @@ class SolarisZonesDriver(driver.ComputeDriver):
             sysconfig.create_sc_profile(fp, sysconfig.create_hostname(name))
 
     def _create_config(self, context, instance, network_info, block_device_info,
-                       sc_dir, admin_password=None):
+                       sc_dir, admin_password=None, needs_configdrive=None):
         """Create a new Solaris Zone configuration."""
+        if needs_configdrive is None:
+            needs_configdrive = configdrive.required_by(instance)
         name = instance['name']
         if self._get_zone_by_name(name) is not None:
             raise exception.InstanceExists(name=name)
 
         flavor = self._get_flavor(instance)
-        extra_specs = flavor['extra_specs'].copy()
+        extra_specs = self._get_extra_specs(instance)
 
         # If unspecified, default zone brand is ZONE_BRAND_SOLARIS
         brand = extra_specs.get('zonecfg:brand')
@@ -1587,20 +1934,20 @@ class SolarisZonesDriver(driver.ComputeDriver):
                    % (brand, name)))
             raise exception.NovaException(msg)
 
-        tstate = instance['task_state']
-        if tstate not in [task_states.RESIZE_FINISH,
-                          task_states.RESIZE_REVERTING,
-                          task_states.RESIZE_MIGRATING,
-                          task_states.REBUILD_SPAWNING] or \
-            (tstate == task_states.REBUILD_SPAWNING and
-             instance.system_metadata['rebuilding'] == 'true'):
+        if self._needs_sysconfig(instance):
             sc_profile = extra_specs.get('install:sc_profile')
             if sc_profile is not None:
+                # A single profile is copied, as the profiles generated
+                # below are written into the top of sc_dir and could
+                # otherwise overwrite the original through a link.  The
+                # files of a profile tree are only read, from their own
+                # subdirectory, so link them in where possible.
                 if os.path.isfile(sc_profile):
                     shutil.copy(sc_profile, sc_dir)
                 elif os.path.isdir(sc_profile):
                     shutil.copytree(sc_profile,
-                                    os.path.join(sc_dir, 'sysconfig'))
+                                    os.path.join(sc_dir, 'sysconfig'),
+                                    copy_function=utils.link_or_copy_file)
 
             self._verify_sysconfig(sc_dir, instance, admin_password)
 
@@ -1608,30 +1955,48 @@ class SolarisZonesDriver(driver.ComputeDriver):
                   % (name, instance['display_name']))
         try:
             self.zone_manager.create(name, None, template)
-            self._set_global_properties(name, extra_specs, brand)
-            hostid = instance.system_metadata.get('hostid')
-            if hostid:
-                zone = self._get_zone_by_name(name)
-                with ZoneConfig(zone) as zc:
-                    zc.setprop('global', 'hostid', hostid)
-
+            # Look the new zone up once and hand it to the helpers below.
+            zone = self._require_zone(name)
             root_device_name = block_device_info.get('root_device_name')
+            volumes = []
+            root_ci = None
             for entry in block_device_info.get('block_device_mapping'):
                 connection_info = entry.get('connection_info')
                 if connection_info is not None:
+                    volumes.append((entry['mount_device'], connection_info))
                     if entry['mount_device'] == root_device_name:
-                        self._set_boot_device(
-                            name, connection_info, brand, root_device_name)
-                    else:
-                        self.attach_volume(
-                            context, connection_info, instance, entry['mount_device'])
+                        root_ci = connection_info
+
+            # Resolving the boot device URI can take several retries, so do
+            # it before the configuration is opened for editing.
+            if root_ci is not None:
+                root_suri = self._suri_from_volume_info(root_ci)
+
+            # Make the flavor derived settings and the boot device in a
+            # single configuration edit so that they are committed together.
+            with self._zone_txn(name, zone=zone) as zc:
+                self._set_global_properties(name, extra_specs, brand, zc)
+                hostid = instance.system_metadata.get('hostid')
+                if hostid:
+                    zc.setprop('global', 'hostid', hostid)
+                self._set_num_cpu(name, instance['vcpus'], brand, zc)
+                self._set_memory_cap(name, instance['memory_mb'], brand, zc)
+                if root_ci is not None:
+                    self._set_boot_device(
+                        name, root_ci, brand, root_device_name, zone=zone,
+                        zc=zc, suri=root_suri)
+
+            for mount_device, connection_info in volumes:
+                if mount_device != root_device_name:
+                    self.attach_volume(
+                        context, connection_info, instance, mount_device)
 
-            self._set_num_cpu(name, instance['vcpus'], brand)
-            self._set_memory_cap(name, instance['memory_mb'], brand)
             self._set_network(context, name, instance, network_info, brand,
-                              sc_dir)
-            if configdrive.required_by(instance):
-                self._set_configdrive(name, instance, sc_dir)
+                              sc_dir, zone=zone)
+            # The config drive is added last, once the volumes have taken
+            # their device ids, as it does not set an id of its own.
+            if needs_configdrive:
+                self._set_configdrive(name, instance, sc_dir, zone=zone)
         except Exception as ex:
             reason = utils.zonemgr_strerror(ex)
             LOG.exception(_("Unable to create configuration for instance '%s' "
@@ -1640,18 +2005,23 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
     def _create_vnc_console_service(self, instance):
         """Create a VNC console SMF service for a Solaris Zone"""
-        # Basic environment checks first: vncserver and xterm
-        if not os.path.exists(VNC_SERVER_PATH):
-            LOG.warning(_("Zone VNC console SMF service not available on this "
-                          "compute node. %s is missing. Run 'pkg install "
-                          "x11/server/xvnc'") % VNC_SERVER_PATH)
-            raise exception.ConsoleTypeUnavailable(console_type='vnc')
-
-        if not os.path.exists(XTERM_PATH):
-            LOG.warning(_("Zone VNC console SMF service not available on this "
-                          "compute node. %s is missing. Run 'pkg install "
-                          "terminal/xterm'") % XTERM_PATH)
-            raise exception.ConsoleTypeUnavailable(console_type='vnc')
+        # Basic environment checks first: vncserver and xterm. Once both
+        # have been found there is no need to look for them again; until
+        # then keep checking so that installing them takes effect.
+        if not self._vnc_tools_present:
+            if not os.path.exists(VNC_SERVER_PATH):
+                LOG.warning(_("Zone VNC console SMF service not available on "
+                              "this compute node. %s is missing. Run 'pkg "
+                              "install x11/server/xvnc'") % VNC_SERVER_PATH)
+                raise exception.ConsoleTypeUnavailable(console_type='vnc')
+
+            if not os.path.exists(XTERM_PATH):
+                LOG.warning(_("Zone VNC console SMF service not available on "
+                              "this compute node. %s is missing. Run 'pkg "
+                              "install terminal/xterm'") % XTERM_PATH)
+                raise exception.ConsoleTypeUnavailable(console_type='vnc')
+
+            self._vnc_tools_present = True
 
         name = instance['name']
         # TODO(npower): investigate using RAD instead of CLI invocation
@@ -1665,8 +2035,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
                 return
             reason = ex.stderr
             LOG.exception(_("Unable to create zone VNC console SMF service "
-                            "'{0}': {1}").format(VNC_CONSOLE_BASE_FMRI + ':' +
-                                                 name, reason))
+                            "'{0}': {1}").format(_vnc_console_fmri(name),
+                                                 reason))
             raise
 
     def _delete_vnc_console_service(self, instance):
@@ -1687,23 +2057,28 @@ class SolarisZonesDriver(driver.ComputeDriver):
             reason = ex.stderr
             LOG.exception(_("Unable to delete zone VNC console SMF service "
                             "'%s': %s")
-                          % (VNC_CONSOLE_BASE_FMRI + ':' + name, reason))
+                          % (_vnc_console_fmri(name), reason))
             raise
 
+    def _svccfg_run(self, fmri, *subcommands):
+        """Run several svccfg subcommands against fmri with a single svccfg
+        invocation, which reads them from its standard input.
+        """
+        return processutils.execute('/usr/sbin/svccfg', '-s', fmri,
+                                    process_input='\n'.join(subcommands) + '\n')
+
     def _enable_vnc_console_service(self, instance):
         """Enable a zone VNC console SMF service"""
         name = instance['name']
 
-        console_fmri = VNC_CONSOLE_BASE_FMRI + ':' + name
+        console_fmri = _vnc_console_fmri(name)
         # TODO(npower): investigate using RAD instead of CLI invocation
         try:
             # The console SMF service exits with SMF_TEMP_DISABLE to prevent
             # unnecessarily coming online at boot. Tell it to really bring
             # it online.
-            out, err = processutils.execute('/usr/sbin/svccfg', '-s', console_fmri,
-                                            'setprop', 'vnc/nova-enabled=true')
-            out, err = processutils.execute('/usr/sbin/svccfg', '-s', console_fmri,
-                                            'refresh')
+            self._svccfg_run(console_fmri, 'setprop vnc/nova-enabled=true',
+                             'refresh')
             out, err = processutils.execute('/usr/sbin/svcadm', 'enable',
                                             console_fmri)
         except processutils.ProcessExecutionError as ex:
@@ -1717,9 +2092,12 @@ class SolarisZonesDriver(driver.ComputeDriver):
                             "'%s': %s") % (console_fmri, reason))
             raise
 
-        # Allow some time for the console service to come online.
-        greenthread.sleep(2)
+        # Allow some time for the console service to come online, polling
+        # quickly at first and backing off while it is still starting.
+        delay = SMF_POLL_INTERVAL
         while True:
+            greenthread.sleep(delay)
+            delay = min(delay * 2, SMF_POLL_INTERVAL_MAX)
             try:
                 out, err = processutils.execute('/usr/bin/svcs', '-H', '-o', 'state',
                                                 console_fmri)
@@ -1734,7 +2112,6 @@ class SolarisZonesDriver(driver.ComputeDriver):
                         instance_uuid=instance['uuid'])
                 # Wait for service state to transition to (hopefully) online
                 # state or offline/maintenance states.
-                greenthread.sleep(2)
             except processutils.ProcessExecutionError as ex:
                 reason = ex.stderr
                 LOG.exception(_("Error querying state of zone VNC console SMF "
@@ -1744,10 +2121,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
         try:
             # The console SMF service exits with SMF_TEMP_DISABLE to prevent
             # unnecessarily coming online at boot. Make that happen.
-            out, err = processutils.execute('/usr/sbin/svccfg', '-s', console_fmri,
-                                            'setprop', 'vnc/nova-enabled=false')
-            out, err = processutils.execute('/usr/sbin/svccfg', '-s', console_fmri,
-                                            'refresh')
+            self._svccfg_run(console_fmri, 'setprop vnc/nova-enabled=false',
+                             'refresh')
         except processutils.ProcessExecutionError as ex:
             reason = ex.stderr
             LOG.exception(_("Unable to update 'vnc/nova-enabled' property for "
@@ -1758,11 +2133,13 @@ class SolarisZonesDriver(driver.ComputeDriver):
     def _disable_vnc_console_service(self, instance):
         """Disable a zone VNC console SMF service"""
         name = instance['name']
+        # The service picks a new port when it is next started.
+        self._vnc_port_cache.pop(instance['uuid'], None)
         if not self._has_vnc_console_service(instance):
             LOG.debug(_("Ignoring attempt to disable a non-existent zone VNC "
                         "console SMF service for instance '%s'") % name)
             return
-        console_fmri = VNC_CONSOLE_BASE_FMRI + ':' + name
+        console_fmri = _vnc_console_fmri(name)
         # TODO(npower): investigate using RAD instead of CLI invocation
         try:
             out, err = processutils.execute('/usr/sbin/svcadm', 'disable',
@@ -1790,7 +2167,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
                           "VNC console SMF service for instance '%s'")
                         % name)
             return None
-        console_fmri = VNC_CONSOLE_BASE_FMRI + ':' + name
+        console_fmri = _vnc_console_fmri(name)
         # TODO(npower): investigate using RAD instead of CLI invocation
         try:
             state, err = processutils.execute('/usr/sbin/svcs', '-H', '-o', 'state',
@@ -1806,7 +2183,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
     def _has_vnc_console_service(self, instance):
         """Returns True if the instance has a zone VNC console SMF service"""
         name = instance['name']
-        console_fmri = VNC_CONSOLE_BASE_FMRI + ':' + name
+        console_fmri = _vnc_console_fmri(name)
         # TODO(npower): investigate using RAD instead of CLI invocation
         try:
             processutils.execute('/usr/bin/svcs', '-H',
@@ -1815,12 +2192,10 @@ class SolarisZonesDriver(driver.ComputeDriver):
         except Exception:
             return False
 
-    def _install(self, instance, image, sc_dir):
+    def _install(self, instance, image, sc_dir, zone=None):
         """Install a new Solaris Zone root file system."""
         name = instance['name']
-        zone = self._get_zone_by_name(name)
-        if zone is None:
-            raise exception.InstanceNotFound(instance_id=name)
+        zone = self._require_zone(name, zone)
 
         # log the zone's configuration
         with ZoneConfig(zone) as zc:
@@ -1830,7 +2205,9 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
         options = ['-a', image]
 
-        if os.listdir(sc_dir):
+        with os.scandir(sc_dir) as it:
+            sc_dir_empty = next(it, None) is None
+        if not sc_dir_empty:
             # the directory isn't empty so pass it along to install
             options.extend(['-c', sc_dir])
 
@@ -1849,12 +2226,10 @@ class SolarisZonesDriver(driver.ComputeDriver):
         LOG.debug(_("Installation of instance '%s' (%s) complete") %
                   (name, instance['display_name']))
 
-    def _attach(self, instance):
+    def _attach(self, instance, zone=None):
         """Install a new Solaris Zone root file system."""
         name = instance['name']
-        zone = self._get_zone_by_name(name)
-        if zone is None:
-            raise exception.InstanceNotFound(instance_id=name)
+        zone = self._require_zone(name, zone)
 
         # log the zone's configuration
         with ZoneConfig(zone) as zc:
@@ -1879,29 +2254,28 @@ class SolarisZonesDriver(driver.ComputeDriver):
         LOG.debug(_("Attaching of instance '%s' (%s) complete") %
                   (name, instance['display_name']))
 
-    def _power_on(self, instance, network_info):
+    def _power_on(self, instance, network_info, zone=None):
         """Power on a Solaris Zone."""
         name = instance['name']
-        zone = self._get_zone_by_name(name)
-        if zone is None:
-            raise exception.InstanceNotFound(instance_id=name)
+        zone = self._require_zone(name, zone)
 
         # Attempt to update the zones hostid in the instance data, to catch
         # those instances that might have been created without a hostid stored.
         self._set_instance_metahostid(instance)
 
         bootargs = []
+        reset_bootargs = False
+        persistent = 'False'
+        meta_bootargs = None
+        cur_bootargs = None
         if CONF.solariszones.solariszones_boot_options:
-            reset_bootargs = False
-            persistent = 'False'
-
-            # Get any bootargs already set in the zone
-            cur_bootargs = utils.lookup_resource_property(zone, 'global', 'bootargs')
-
             # Get any bootargs set in the instance metadata by the user
             meta_bootargs = instance.metadata.get('bootargs')
 
             if meta_bootargs:
+                # Get any bootargs already set in the zone
+                cur_bootargs = utils.lookup_resource_property(
+                    zone, 'global', 'bootargs')
                 bootargs = ['--', str(meta_bootargs)]
                 persistent = str(
                     instance.metadata.get('bootargs_persist', 'False'))
@@ -1933,12 +2307,10 @@ class SolarisZonesDriver(driver.ComputeDriver):
                         # restore original boot args in zone config
                         zc.setprop('global', 'bootargs', cur_bootargs)
 
-    def _uninstall(self, instance):
+    def _uninstall(self, instance, zone=None):
         """Uninstall an existing Solaris Zone root file system."""
         name = instance['name']
-        zone = self._get_zone_by_name(name)
-        if zone is None:
-            raise exception.InstanceNotFound(instance_id=name)
+        zone = self._require_zone(name, zone)
 
         if zone.state == ZONE_STATE_CONFIGURED:
             LOG.debug(_("Uninstall not required for zone '%s' in state '%s'")
@@ -1966,9 +2338,12 @@ class SolarisZonesDriver(driver.ComputeDriver):
             LOG.exception(_("Unable to delete configuration for instance '%s' "
                             "via zonemgr(3RAD): %s") % (name, reason))
             raise
+        finally:
+            self._invalidate_zone_cache(name)
 
     def _waitfor_copydone(self, name):
-        failcount = 0
+        deadline = time.monotonic() + COPYDONE_TIMEOUT
+        delay = COPYDONE_POLL_INTERVAL
         cbi_service = 'svc:/application/cloudbase-init:default'
         cbi_state = None
         end_states = ['online', 'degraded', 'maintenance', 'disabled']
@@ -1983,11 +2358,11 @@ class SolarisZonesDriver(driver.ComputeDriver):
                 # return any kind of state, and the zlogin is failing, then
                 # simply get out of the process of protecting the config-drive
                 # but leave it attached to the zone.
-                if failcount > 120:
+                if time.monotonic() > deadline:
                     return False
 
-                failcount = failcount + 1
-                greenthread.sleep(1)
+                greenthread.sleep(delay)
+                delay = min(delay * 1.5, COPYDONE_POLL_INTERVAL_MAX)
                 continue
 
             if cbi_state == "disabled" and cbi_state in end_states:
@@ -2006,6 +2381,10 @@ class SolarisZonesDriver(driver.ComputeDriver):
                 if out == "true":
                     break
 
+            if cbi_state not in end_states:
+                greenthread.sleep(delay)
+                delay = min(delay * 1.5, COPYDONE_POLL_INTERVAL_MAX)
+
         return True
 
     def spawn(self, context, instance, image_meta, injected_files,
@@ -2060,6 +2439,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
         """
         name = instance.name
         brand = self._validate_flavor(instance)
+        bdm_list = block_device_info.setdefault('block_device_mapping', [])
 
         install_image_path = None
 
@@ -2089,8 +2469,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
                         'volume_path': volume_path,
                     }
                 }
-                block_device_info.setdefault(
-                    'block_device_mapping', []).append(mapping)
+                bdm_list.append(mapping)
 
         # create a new directory for SC profiles
         sc_dir = tempfile.mkdtemp(prefix="nova-sysconfig-",
@@ -2098,7 +2477,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
         os.chmod(sc_dir, 0o755)
 
         # Create the configdrive if required.
-        if configdrive.required_by(instance):
+        needs_configdrive = configdrive.required_by(instance)
+        if needs_configdrive:
             instance_md = instance_metadata.InstanceMetadata(
                 instance,
                 content=injected_files)
@@ -2110,18 +2490,21 @@ class SolarisZonesDriver(driver.ComputeDriver):
                     LOG.warning(
                         _("Failed to create config drive '%s'" % cd_path))
 
+        zone = None
         try:
             self._create_config(context, instance, network_info,
-                                block_device_info, sc_dir, admin_password)
+                                block_device_info, sc_dir, admin_password,
+                                needs_configdrive)
+            zone = self._require_zone(name)
 
             if install_image_path:
-                self._install(instance, install_image_path, sc_dir)
+                self._install(instance, install_image_path, sc_dir, zone)
             else:
-                self._attach(instance)
+                self._attach(instance, zone)
 
             if power_on:
-                self._power_on(instance, network_info)
-            if configdrive.required_by(instance):
+                self._power_on(instance, network_info, zone)
+            if needs_configdrive:
                 unset = self._waitfor_copydone(name)
                 if unset:
                     self._unset_configdrive(name, instance)
@@ -2129,26 +2512,37 @@ class SolarisZonesDriver(driver.ComputeDriver):
             reason = utils.zonemgr_strerror(ex)
             LOG.exception(_("Unable to spawn instance '%s' via zonemgr(3RAD): "
                             "'%s'") % (name, reason))
-            # At least attempt to uninstall the instance, depending on where
-            # the installation got to there could be things left behind that
-            # need to be cleaned up, e.g a root zpool etc.
-            try:
-                self._uninstall(instance)
-            except Exception as ex:
-                reason = utils.zonemgr_strerror(ex)
-                LOG.debug(_("Unable to uninstall instance '%s' via "
-                            "zonemgr(3RAD): %s") % (name, reason))
-            try:
-                self._delete_config(instance)
-            except Exception as ex:
-                reason = utils.zonemgr_strerror(ex)
-                LOG.debug(_("Unable to unconfigure instance '%s' via "
-                            "zonemgr(3RAD): %s") % (name, reason))
+            # Only clean up a zone that this spawn created; if the
+            # configuration was never created there is nothing to undo, and
+            # an existing zone of the same name is not ours to remove.
+            if isinstance(ex, exception.InstanceExists):
+                zone = None
+            else:
+                self._extra_specs_cache.pop(instance['uuid'], None)
+                self._password_fingerprints.pop(instance['uuid'], None)
+                if zone is None:
+                    zone = self._get_zone_by_name(name)
+            if zone is not None:
+                # At least attempt to uninstall the instance, depending on
+                # where the installation got to there could be things left
+                # behind that need to be cleaned up, e.g a root zpool etc.
+                try:
+                    self._uninstall(instance, zone)
+                except Exception as ex:
+                    reason = utils.zonemgr_strerror(ex)
+                    LOG.debug(_("Unable to uninstall instance '%s' via "
+                                "zonemgr(3RAD): %s") % (name, reason))
+                try:
+                    self._delete_config(instance)
+                except Exception as ex:
+                    reason = utils.zonemgr_strerror(ex)
+                    LOG.debug(_("Unable to unconfigure instance '%s' via "
+                                "zonemgr(3RAD): %s") % (name, reason))
 
             raise
         finally:
             # remove the sc_profile temp directory
-            shutil.rmtree(sc_dir)
+            _cleanup_sc_dir(sc_dir)
 
     def _spawn_old(self, context, instance, image_meta, injected_files,
                    admin_password, allocations, network_info=None,
@@ -2157,6 +2551,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
         LOG.debug(block_device_info)
         name = instance.name
         brand = self._validate_flavor(instance)
+        bdm_list = block_device_info.get('block_device_mapping') or []
 
         image_path = None
         if instance.image_ref:
@@ -2184,7 +2579,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
             # Ensure no block device mappings attempt to use the reserved boot
             # device (c1d0).
-            for entry in block_device_info.get('block_device_mapping'):
+            for entry in bdm_list:
                 if entry['connection_info'] is None:
                     continue
 
@@ -2198,7 +2593,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
             volume_id = volume['id']
             try:
                 connection_info = self._connect_boot_volume(volume, mountpoint,
-                                                            context, instance)
+                                                            context, instance,
+                                                            brand)
             except exception.InvalidVolume as reason:
                 # This Cinder volume is not usable for ZOSS so discard it.
                 # zonecfg will apply default zonepath dataset configuration
@@ -2220,7 +2616,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
         os.chmod(sc_dir, 0o755)
 
         # Create the configdrive if required.
-        if configdrive.required_by(instance):
+        needs_configdrive = configdrive.required_by(instance)
+        if needs_configdrive:
             instance_md = instance_metadata.InstanceMetadata(
                 instance,
                 content=injected_files)
@@ -2234,18 +2631,19 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
         try:
             self._create_config(context, instance, network_info,
-                                connection_info, sc_dir, admin_password)
+                                connection_info, sc_dir, admin_password,
+                                needs_configdrive)
 
             if image_meta.container_format == 'ovf' and image_path is not None:
                 self._install(instance, image_path, sc_dir)
 
-            for entry in block_device_info.get('block_device_mapping'):
+            for entry in bdm_list:
                 if entry['connection_info'] is not None:
                     self.attach_volume(context, entry['connection_info'],
                                        instance, entry['mount_device'])
 
             self._power_on(instance, network_info)
-            if configdrive.required_by(instance):
+            if needs_configdrive:
                 unset = self._waitfor_copydone(name)
                 if unset:
                     self._unset_configdrive(name, instance)
@@ -2278,7 +2676,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
             raise
         finally:
             # remove the sc_profile temp directory
-            shutil.rmtree(sc_dir)
+            _cleanup_sc_dir(sc_dir)
 
         if connection_info is not None:
             bdm_obj = objects.BlockDeviceMappingList()
@@ -2296,13 +2694,11 @@ class SolarisZonesDriver(driver.ComputeDriver):
             bdm['volume_size'] = instance['root_gb']
             bdm.save()
 
-    def _power_off(self, instance, halt_type):
+    def _power_off(self, instance, halt_type, zone=None):
         """Power off a Solaris Zone."""
         name = instance['name']
         LOG.debug("powering off: %s", name)
-        zone = self._get_zone_by_name(name)
-        if zone is None:
-            raise exception.InstanceNotFound(instance_id=name)
+        zone = self._require_zone(name, zone)
 
         # Attempt to update the zones hostid in the instance data, to catch
         # those instances that might have been created without a hostid stored.
@@ -2335,13 +2731,13 @@ class SolarisZonesDriver(driver.ComputeDriver):
         """
         self.power_off(instance)
 
-        extra_specs = self._get_flavor(instance)['extra_specs'].copy()
-        brand = extra_specs.get('zonecfg:brand', ZONE_BRAND_SOLARIS)
+        brand = self._get_brand(instance)
 
         name = instance['name']
 
-        self._set_num_cpu(name, instance.vcpus, brand)
-        self._set_memory_cap(name, instance.memory_mb, brand)
+        with self._zone_txn(name) as zc:
+            self._set_num_cpu(name, instance.vcpus, brand, zc)
+            self._set_memory_cap(name, instance.memory_mb, brand, zc)
 
         rgb = instance.root_gb
         old_rvid = instance.system_metadata.get('old_instance_volid')
@@ -2397,6 +2793,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
         except Exception:
             pass
 
+        self._extra_specs_cache.pop(instance['uuid'], None)
+        self._password_fingerprints.pop(instance['uuid'], None)
         name = instance['name']
         zone = self._get_zone_by_name(name)
         # If instance cannot be found, just return.
@@ -2406,11 +2804,15 @@ class SolarisZonesDriver(driver.ComputeDriver):
             return
 
         try:
-            if self._get_state(zone) == power_state.RUNNING:
-                self._power_off(instance, 'HARD')
-            if self._get_state(zone) == power_state.SHUTDOWN:
-                self._uninstall(instance)
-            if self._get_state(zone) == power_state.NOSTATE:
+            # Only read the state again after an operation that changes it.
+            state = self._get_state(zone)
+            if state == power_state.RUNNING:
+                self._power_off(instance, 'HARD', zone)
+                state = self._get_state(zone)
+            if state == power_state.SHUTDOWN:
+                self._uninstall(instance, zone)
+                state = self._get_state(zone)
+            if state == power_state.NOSTATE:
                 self._delete_config(instance)
             if configdrive.required_by(instance):
                 # Make sure that we don't leave any dirt around.
@@ -2443,15 +2845,31 @@ class SolarisZonesDriver(driver.ComputeDriver):
             return
 
         tags = ['old_instance_volid', 'new_instance_volid']
-        for tag in tags:
-            volid = instance.system_metadata.get(tag)
-            if volid:
-                try:
-                    LOG.debug(_("Deleting volume %s"), volid)
-                    self._volume_api.delete(context, volid)
-                    del instance.system_metadata[tag]
-                except Exception:
-                    pass
+        volids = [(tag, instance.system_metadata.get(tag)) for tag in tags]
+        volids = [(tag, volid) for tag, volid in volids if volid]
+        if not volids:
+            return
+
+        def _delete_volume(volid):
+            try:
+                LOG.debug(_("Deleting volume %s"), volid)
+                self._volume_api.delete(context, volid)
+            except Exception:
+                return False
+            return True
+
+        # The volumes are independent, so delete them concurrently and then
+        # record all of the removed volume ids in a single save.
+        pool = greenpool.GreenPool(len(volids))
+        deleted = list(pool.imap(_delete_volume,
+                                 [volid for _tag, volid in volids]))
+        dirty = False
+        for (tag, _volid), ok in zip(volids, deleted):
+            if ok:
+                instance.system_metadata.pop(tag, None)
+                dirty = True
+        if dirty:
+            instance.save()
 
     def cleanup(self, context, instance, network_info, block_device_info=None,
                 destroy_disks=True, migrate_data=None, destroy_vifs=True):
@@ -2504,17 +2922,18 @@ class SolarisZonesDriver(driver.ComputeDriver):
             return
 
         bootargs = []
+        reset_bootargs = False
+        persistent = 'False'
+        meta_bootargs = None
+        cur_bootargs = None
         if CONF.solariszones.solariszones_boot_options:
-            reset_bootargs = False
-            persistent = 'False'
-
-            # Get any bootargs already set in the zone
-            cur_bootargs = utils.lookup_resource_property(zone, 'global', 'bootargs')
-
             # Get any bootargs set in the instance metadata by the user
             meta_bootargs = instance.metadata.get('bootargs')
 
             if meta_bootargs:
+                # Get any bootargs already set in the zone
+                cur_bootargs = utils.lookup_resource_property(
+                    zone, 'global', 'bootargs')
                 bootargs = ['--', str(meta_bootargs)]
                 persistent = str(
                     instance.metadata.get('bootargs_persist', 'False'))
@@ -2561,7 +2980,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
         MAX_CONSOLE_BYTES characters) by reassembling the log files
         that Solaris Zones framework maintains for each zone.
         """
-        console_str = ""
+        parts = deque()
         avail = MAX_CONSOLE_BYTES
 
         # Examine the log files in most-recently modified order, keeping
@@ -2575,25 +2994,35 @@ class SolarisZonesDriver(driver.ComputeDriver):
         # The remainder constitutes the start of the resulting console
         # output which is then prepended to the console string built so
         # far and the result returned.
-        logfile_pattern = '/var/log/zones/%s.console*' % instance['name']
-        logfiles = sorted(glob.glob(logfile_pattern), key=os.path.getmtime,
-                          reverse=True)
-        for file in logfiles:
-            size = os.path.getsize(file)
+        prefix = instance['name'] + '.console'
+        logfiles = []
+        try:
+            with os.scandir('/var/log/zones') as it:
+                for entry in it:
+                    if entry.name.startswith(prefix) and entry.is_file():
+                        st = entry.stat()
+                        logfiles.append((st.st_mtime, st.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+        logfiles.sort(reverse=True)
+        for _mtime, size, file in logfiles:
             if size == 0:
                 continue
             avail -= size
-            with open(file, 'r') as log:
+            with open(file, 'rb') as log:
                 if avail < 0:
-                    (fragment, _) = utils.last_bytes(log, avail + size)
-                    remainder = fragment.find('\n') + 1
-                    console_str = fragment[remainder:] + console_str
+                    # The log may have been rotated or truncated since it
+                    # was listed, so never seek before its start.
+                    end = log.seek(0, os.SEEK_END)
+                    log.seek(max(0, end - (avail + size)))
+                    fragment = log.read()
+                    remainder = fragment.find(b'\n') + 1
+                    parts.appendleft(fragment[remainder:])
                     break
-                fragment = ''
-                for line in log.readlines():
-                    fragment += line
-                console_str = fragment + console_str
-        return console_str
+                parts.appendleft(log.read())
+            if avail == 0:
+                break
+        return b''.join(parts).decode('utf-8', 'replace')
 
     def get_console_output(self, context, instance):
         LOG.debug("get_console_output")
@@ -2627,8 +3056,21 @@ class SolarisZonesDriver(driver.ComputeDriver):
                       "instance '%s'") % name)
             self._create_vnc_console_service(instance)
 
+        host = CONF.vnc.vncserver_proxyclient_address
+
+        # The port stays the same for as long as the service keeps running,
+        # so a port read earlier can be reused, without enabling the
+        # service again, if it is still online.  If it is not, enabling it
+        # below may start it on another port.
+        port = self._vnc_port_cache.get(instance['uuid'])
+        if port is not None:
+            if self._get_vnc_console_service_state(instance) == 'online':
+                return ctype.ConsoleVNC(host=host, port=port,
+                                        internal_access_path=None)
+            self._vnc_port_cache.pop(instance['uuid'], None)
+
         self._enable_vnc_console_service(instance)
-        console_fmri = VNC_CONSOLE_BASE_FMRI + ':' + name
+        console_fmri = _vnc_console_fmri(name)
 
         # The console service sets an SMF instance property for the port
         # on which the VNC service is listening. The service needs to be
@@ -2643,11 +3085,11 @@ class SolarisZonesDriver(driver.ComputeDriver):
                             "'%s': %s" % (console_fmri, reason)))
             raise
 
-        host = CONF.vnc.vncserver_proxyclient_address
         try:
             out, err = processutils.execute('/usr/bin/svcprop', '-p', 'vnc/port',
                                             console_fmri)
             port = int(out.strip())
+            self._vnc_port_cache[instance['uuid']] = port
             return ctype.ConsoleVNC(host=host, port=port,
                                     internal_access_path=None)
         except processutils.ProcessExecutionError as ex:
@@ -2707,10 +3149,12 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
         diagnostics = defaultdict(lambda: 0)
 
-        for stat in ['lockedmem', 'nprocs', 'swapresv']:
-            uri = "kstat:/zone_caps/caps/%s_zone_%d/%d" % (stat, zone.id,
-                                                           zone.id)
-            diagnostics[stat] = self._kstat_data(uri)['usage']
+        caps = ['lockedmem', 'nprocs', 'swapresv']
+        uris = ["kstat:/zone_caps/caps/%s_zone_%d/%d" % (stat, zone.id, zone.id)
+                for stat in caps]
+        for stat, data in zip(caps, self._kstat_data_batch(uris)):
+            if data is not None:
+                diagnostics[stat] = data['usage']
 
         # Get the inital accumulated data kstat, then get the sys_zone kstat
         # and sum all the "*_cur" statistics in it. Then re-get the accumulated
@@ -2719,7 +3163,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
         # something keeps pulling cpus out from under us.
 
         uri = "kstat:/zones/%s/cpu" % zone.name
-        accum_uri = "kstat:/zones/%s/cpu/accum/sys" % zone.name
+        cpu_uri_prefix = uri + "/"
+        accum_uri = cpu_uri_prefix + "accum/sys"
 
         for _attempt in range(3):
             initial = self._kstat_data(accum_uri)
@@ -2734,11 +3179,13 @@ class SolarisZonesDriver(driver.ComputeDriver):
             cpus.pop('pset_accum')
 
             # Turn the list of cpu ids in data.keys into a dictionary of the
-            # 'sys' kstat for each cpu id.
+            # 'sys' kstat for each cpu id.  The kstat chain has just been
+            # updated, so fetch the per-cpu kstats without updating it again
+            # for each of them.
             data = {}
             datapoint = None
             for n in cpus:
-                datapoint = self._kstat_data(uri + "/%s" % n)
+                datapoint = self._kstat_fetch(cpu_uri_prefix + n)
                 # We could not get a datapoint for one of the cpus, so try the
                 # whole thing again if zone.state is still running.
                 if datapoint is None:
@@ -2756,7 +3203,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
             # and all elements have the same map of statistics, since they're
             # all the same kstat type. This gets a list of all the statistics
             # which end in "_cur" from the first (guaranteed) kstat element.
-            stats = [k for k in data[data.keys()[0]].getMap().keys() if
+            stats = [k for k in next(iter(data.values())).getMap().keys() if
                      k.endswith("_cur")]
 
             for stat in stats:
@@ -2842,8 +3289,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
         if zone is None:
             raise exception.InstanceNotFound(instance_id=name)
 
-        extra_specs = self._get_flavor(instance)['extra_specs'].copy()
-        brand = extra_specs.get('zonecfg:brand', ZONE_BRAND_SOLARIS)
+        brand = self._get_brand(instance)
         if brand != ZONE_BRAND_SOLARIS_KZ:
             # Only Solaris kernel zones are currently supported.
             reason = (_("'%s' branded zones are not currently supported")
@@ -2890,8 +3336,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
         if zone is None:
             raise exception.InstanceNotFound(instance_id=name)
 
-        extra_specs = self._get_flavor(instance)['extra_specs'].copy()
-        brand = extra_specs.get('zonecfg:brand', ZONE_BRAND_SOLARIS)
+        brand = self._get_brand(instance)
         if brand != ZONE_BRAND_SOLARIS_KZ:
             # Only Solaris kernel zones are currently supported.
             reason = (_("'%s' branded zones are not currently supported")
@@ -2925,9 +3370,9 @@ class SolarisZonesDriver(driver.ComputeDriver):
                 # configuration will reflect what is in cinder before we raise
                 # the exception, therefore failing the detach and leaving the
                 # volume in-use.
-                needed_props = ["storage", "bootpri"]
-                props = filter(lambda prop: prop.name in needed_props,
-                               resource.properties)
+                needed_props = frozenset(["storage", "bootpri"])
+                props = [prop for prop in resource.properties
+                         if prop.name in needed_props]
                 with ZoneConfig(zone) as zc:
                     zc.addresource("device", props)
 
@@ -2980,8 +3425,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
             raise exception.InstanceNotFound(instance_id=name)
 
         ctxt = nova_context.get_admin_context()
-        extra_specs = self._get_flavor(instance)['extra_specs'].copy()
-        brand = extra_specs.get('zonecfg:brand', ZONE_BRAND_SOLARIS)
+        brand = self._get_brand(instance)
         anetname = self._set_net_info(ctxt, zone, brand, False, vif)
 
         # apply the configuration if the vm is ACTIVE
@@ -3030,8 +3474,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
                      "instance '%s'.") % (vif['address'], name))
             raise nova.exception.NovaException(msg)
 
-        extra_specs = self._get_flavor(instance)['extra_specs'].copy()
-        brand = extra_specs.get('zonecfg:brand', ZONE_BRAND_SOLARIS)
+        brand = self._get_brand(instance)
         for prop in resource.properties:
             if brand == ZONE_BRAND_SOLARIS and prop.name == 'linkname':
                 anetname = prop.value
@@ -3052,15 +3495,16 @@ class SolarisZonesDriver(driver.ComputeDriver):
                 msg = (_("Unable to detach interface '%s' from running "
                          "instance '%s' because the resource is most likely "
                          "in use.") % (anetname, name))
-                needed_props = ["lower-link", "configure-allowed-address",
-                                "mac-address", "mtu"]
                 if brand == ZONE_BRAND_SOLARIS:
-                    needed_props.append("linkname")
+                    link_prop = "linkname"
                 else:
-                    needed_props.append("id")
+                    link_prop = "id"
+                needed_props = frozenset(["lower-link",
+                                          "configure-allowed-address",
+                                          "mac-address", "mtu", link_prop])
 
-                props = filter(lambda prop: prop.name in needed_props,
-                               resource.properties)
+                props = [prop for prop in resource.properties
+                         if prop.name in needed_props]
                 with ZoneConfig(zone) as zc:
                     zc.addresource('anet', props)
                 raise nova.exception.NovaException(msg)
@@ -3114,8 +3558,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
         if samehost:
             instance.system_metadata['resize_samehost'] = samehost
 
-        extra_specs = self._get_flavor(instance)['extra_specs'].copy()
-        brand = extra_specs.get('zonecfg:brand', ZONE_BRAND_SOLARIS)
+        brand = self._get_brand(instance)
         if brand != ZONE_BRAND_SOLARIS_KZ and not samehost:
             reason = (_("'%s' branded zones do not currently support resize "
                         "to a different host.") % brand)
@@ -3135,13 +3578,13 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
         disk_info = None
         if nrgb > orgb or not samehost:
-            bmap = block_device_info.get('block_device_mapping')
             rootmp = instance.root_device_name
-            for entry in bmap:
-                mountdev = entry['mount_device'].rpartition('/')[2]
-                if mountdev == rootmp:
-                    root_ci = entry['connection_info']
-                    break
+            bdm_by_dev = {entry['mount_device'].rpartition('/')[2]: entry
+                          for entry in
+                          block_device_info.get('block_device_mapping')}
+            root_entry = bdm_by_dev.get(rootmp)
+            if root_entry is not None:
+                root_ci = root_entry['connection_info']
             else:
                 # If this is a non-global zone that is on the same host and is
                 # simply using a dataset, the disk size is purely an OpenStack
@@ -3172,13 +3615,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
             instance.system_metadata['old_instance_volid'] = volume_id
             instance.system_metadata['new_instance_volid'] = newvolume['id']
 
-            # TODO(npower): Polling is what nova/compute/manager also does when
-            # creating a new volume, so we do likewise here.
-            while True:
-                volume = self._volume_api.get(context, newvolume['id'])
-                if volume['status'] != 'creating':
-                    break
-                greenthread.sleep(1)
+            self._wait_for_volume_create(context, newvolume['id'])
 
             if nrgb > orgb:
                 try:
@@ -3208,8 +3645,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
         # look to see if the zone is a kernel zone and is powered off.  If it
         # is raise an exception before trying to archive it
-        extra_specs = self._get_flavor(instance)['extra_specs'].copy()
-        brand = extra_specs.get('zonecfg:brand', ZONE_BRAND_SOLARIS)
+        brand = self._get_brand(instance)
         if zone.state != ZONE_STATE_RUNNING and \
                 brand == ZONE_BRAND_SOLARIS_KZ:
             raise exception.InstanceNotRunning(instance_id=name)
@@ -3256,7 +3692,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
         fileutils.ensure_tree(snapshot_directory)
         snapshot_name = uuid.uuid4().hex
 
-        with utils.tempdir(dir=snapshot_directory) as tmpdir:
+        with tempfile.TemporaryDirectory(dir=snapshot_directory) as tmpdir:
             out_path = os.path.join(tmpdir, snapshot_name)
             zone_name = instance['name']
             processutils.execute('/usr/sbin/archiveadm', 'create', '--root-only',
@@ -3269,7 +3705,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
                 update_task_state(
                     task_state=task_states.IMAGE_UPLOADING,
                     expected_state=task_states.IMAGE_PENDING_UPLOAD)
-                with open(out_path, 'r') as image_file:
+                with open(out_path, 'rb') as image_file:
                     snapshot_service.update(context, image_id, metadata,
                                             image_file)
                     LOG.warning(_("Snapshot image upload complete"),
@@ -3360,25 +3796,25 @@ class SolarisZonesDriver(driver.ComputeDriver):
         if samehost:
             instance.system_metadata['old_vm_state'] = vm_states.RESIZED
 
-        extra_specs = self._get_flavor(instance)['extra_specs'].copy()
-        brand = extra_specs.get('zonecfg:brand', ZONE_BRAND_SOLARIS)
+        brand = self._get_brand(instance)
         name = instance['name']
 
         if disk_info:
-            bmap = block_device_info.get('block_device_mapping')
+            bdm_by_dev = {entry['mount_device']: entry for entry in
+                          block_device_info.get('block_device_mapping')}
             rootmp = instance['root_device_name']
-            for entry in bmap:
-                if entry['mount_device'] == rootmp:
-                    mount_dev = entry['mount_device']
-                    root_ci = entry['connection_info']
-                    break
+            root_entry = bdm_by_dev.get(rootmp)
+            if root_entry is not None:
+                mount_dev = rootmp
+                root_ci = root_entry['connection_info']
 
         try:
             if samehost:
                 cpu = instance.vcpus
                 mem = instance.memory_mb
-                self._set_num_cpu(name, cpu, brand)
-                self._set_memory_cap(name, mem, brand)
+                with self._zone_txn(name) as zc:
+                    self._set_num_cpu(name, cpu, brand, zc)
+                    self._set_memory_cap(name, mem, brand, zc)
 
                 # Add the new disk to the volume if the size of the disk
                 # changed
@@ -3410,11 +3846,10 @@ class SolarisZonesDriver(driver.ComputeDriver):
 
                 zone.attach(['-x', 'initialize-hostdata'])
 
-                bmap = block_device_info.get('block_device_mapping')
-                for entry in bmap:
-                    if entry['mount_device'] != rootmp:
+                for mount_device, entry in bdm_by_dev.items():
+                    if mount_device != rootmp:
                         self.attach_volume(context, entry['connection_info'],
-                                           instance, entry['mount_device'])
+                                           instance, mount_device)
 
             if power_on:
                 self._power_on(instance, network_info)
@@ -3423,12 +3858,11 @@ class SolarisZonesDriver(driver.ComputeDriver):
                     return
 
                 # Toggle the autoexpand to extend the size of the rpool.
-                # We need to sleep for a few seconds to make sure the zone
-                # is in a state to accept the toggle.  Once bugs are fixed
-                # around the autoexpand and the toggle is no longer needed
-                # or zone.boot() returns only after the zone is ready we
-                # can remove this hack.
-                greenthread.sleep(15)
+                # We need to wait for the zone to boot far enough to accept
+                # the toggle.  Once bugs are fixed around the autoexpand and
+                # the toggle is no longer needed or zone.boot() returns only
+                # after the zone is ready we can remove this hack.
+                self._wait_for_zone_login(self._require_zone(name))
                 out, err = processutils.execute('/usr/sbin/zlogin', '-S', name,
                                                 '/usr/sbin/zpool', 'set',
                                                 'autoexpand=off', 'rpool')
@@ -3464,6 +3898,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
             self.destroy(context, instance, network_info)
         else:
             del instance.system_metadata['resize_samehost']
+            # Drop the specs cached for the old flavor.
+            self._extra_specs_cache.pop(instance['uuid'], None)
 
     def _resize_disk_migration(self, context, instance, configured,
                                replacement, newvolumesz, mountdev,
@@ -3499,7 +3935,8 @@ class SolarisZonesDriver(driver.ComputeDriver):
                 zone.detach()
 
             try:
-                self._set_boot_device(name, connection_info, zone.brand)
+                self._set_boot_device(name, connection_info, zone.brand,
+                                      zone=zone)
             finally:
                 if zone.brand == ZONE_BRAND_SOLARIS:
                     zone.attach()
@@ -3865,9 +4302,9 @@ class SolarisZonesDriver(driver.ComputeDriver):
         """Update currently known host stats."""
         host_stats = {}
 
-        host_stats['vcpus'] = os.sysconf('SC_NPROCESSORS_ONLN')
+        host_stats['vcpus'] = self._cached_sysconf('SC_NPROCESSORS_ONLN')
 
-        total_pages = os.sysconf('SC_PHYS_PAGES')
+        total_pages = self._sc_phys_pages
         host_stats['memory_mb'] = int(
             self._pages_to_kb(total_pages) / units.Ki)
 
@@ -4048,7 +4485,11 @@ class SolarisZonesDriver(driver.ComputeDriver):
         if dry_run:
             options.append('-nq')
         options.append('ssh://nova@' + dest)
-        zone.migrate(options)
+        try:
+            zone.migrate(options)
+        finally:
+            if not dry_run:
+                self._invalidate_zone_cache(name)
 
     def live_migration(self, context, instance, dest,
                        post_method, recover_method, block_migration=False,
@@ -4141,6 +4582,10 @@ class SolarisZonesDriver(driver.ComputeDriver):
         except Exception:
             pass
 
+        # The instance now lives on the destination host.
+        self._extra_specs_cache.pop(instance['uuid'], None)
+        self._password_fingerprints.pop(instance['uuid'], None)
+
         name = instance['name']
         zone = self._get_zone_by_name(name)
         # If instance cannot be found, just return.
@@ -4241,8 +4686,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
                          dst_cpu_arch))
             raise exception.MigrationPreCheckError(reason=reason)
 
-        extra_specs = self._get_flavor(instance)['extra_specs'].copy()
-        brand = extra_specs.get('zonecfg:brand', ZONE_BRAND_SOLARIS)
+        brand = self._get_brand(instance)
         if brand != ZONE_BRAND_SOLARIS_KZ:
             # Only Solaris kernel zones are currently supported.
             reason = (_("'%s' branded zones do not currently support live "
@@ -4406,6 +4850,29 @@ class SolarisZonesDriver(driver.ComputeDriver):
         # TODO(Vek): Need to pass context in for access to auth_token
         pass
 
+    def _wait_for_zone_login(self, zone):
+        """Wait until the local file systems of a running zone are mounted,
+        so that commands run through zlogin can update them. Gives up after
+        ZONE_LOGIN_TIMEOUT seconds.
+        """
+        deadline = time.monotonic() + ZONE_LOGIN_TIMEOUT
+        delay = ZONE_LOGIN_POLL_INTERVAL
+        while time.monotonic() < deadline:
+            if zone.state == ZONE_STATE_RUNNING:
+                try:
+                    out, err = processutils.execute(
+                        '/usr/sbin/zlogin', '-S', zone.name, '/usr/bin/svcs',
+                        '-H', '-o', 'state', FS_LOCAL_FMRI)
+                    if out.strip() == 'online':
+                        return
+                except processutils.ProcessExecutionError:
+                    pass
+            greenthread.sleep(delay)
+            delay = min(delay * 2, ZONE_LOGIN_POLL_INTERVAL_MAX)
+
+        LOG.warning(_("Instance '%s' did not become ready for login within "
+                      "%d seconds") % (zone.name, ZONE_LOGIN_TIMEOUT))
+
     def set_admin_password(self, instance, new_pass):
         LOG.debug("set_admin_password")
         """Set the root password on the specified instance.
@@ -4421,7 +4888,7 @@ class SolarisZonesDriver(driver.ComputeDriver):
         if zone.state == ZONE_STATE_RUNNING:
             out, err = processutils.execute('/usr/sbin/zlogin', '-S', name,
                                             '/usr/bin/passwd', '-p',
-                                            "'%s'" % sha256_crypt.encrypt(new_pass))
+                                            "'%s'" % PASSWORD_CONTEXT.hash(new_pass))
         else:
             raise exception.InstanceNotRunning(instance_id=name)
 
@@ -4761,8 +5228,16 @@ class SolarisZonesDriver(driver.ComputeDriver):
             'ip': self.get_host_ip_addr(),
             'host': CONF.host
         }
+        # The iSCSI initiator and the Fibre Channel HBA ports are probed by
+        # separate commands, so let them run concurrently rather than
+        # waiting for each in turn.
+        initiator_thread = None
         if not self._initiator:
-            self._initiator = self._get_iscsi_initiator()
+            initiator_thread = greenthread.spawn(self._get_iscsi_initiator)
+        if not self._fc_wwnns or not self._fc_wwpns:
+            self._get_fc_hbas()
+        if initiator_thread is not None:
+            self._initiator = initiator_thread.wait()
 
         if self._initiator:
             connector['initiator'] = self._initiator
@@ -4841,12 +5316,16 @@ class SolarisZonesDriver(driver.ComputeDriver):
         root_ci = None
         rootmp = instance['root_device_name']
         for entry in bdms:
-            if entry['connection_info'] is None:
+            connection_info = entry['connection_info']
+            if connection_info is None or entry['device_name'] != rootmp:
                 continue
 
-            if entry['device_name'] == rootmp:
-                root_ci = jsonutils.loads(entry['connection_info'])
-                break
+            # Only the root entry is parsed, and only if it has not already
+            # been deserialized.
+            if not isinstance(connection_info, dict):
+                connection_info = jsonutils.loads(connection_info)
+            root_ci = connection_info
+            break
 
         if root_ci is None:
             msg = (_("Unable to find the root device for instance '%s'.")
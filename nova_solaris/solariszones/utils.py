@@ -71,6 +71,20 @@ def lookup_resource_property_value(zone, resource, prop, value):
         raise
 
 
+def lookup_adr_name_key(adr_name, key):
+    """Lookup specified key from a RAD ADR name as returned by
+    list_objects(), e.g. 'name' from
+    'com.oracle.solaris.rad.zonemgr:type=Zone,name=zone1,id=1'. Returns None
+    if the key is not present.
+    """
+    _domain, _sep, kvpairs = str(adr_name).partition(':')
+    for kvpair in kvpairs.split(','):
+        k, sep, v = kvpair.partition('=')
+        if sep and k == key:
+            return v
+    return None
+
+
 def zonemgr_strerror(ex):
     """Format the payload from a zonemgr(3RAD) rad.client.ObjectError
     exception into a sensible error string that can be logged. Newlines
@@ -102,6 +116,19 @@ def copy_file(src, dest):
     # zfs files. 
     processutils.execute('/usr/bin/cp', '-z', src, dest)
 
+def link_or_copy_file(src, dest):
+    """Hard link src to dest, falling back to copying it when a link cannot
+    be made, e.g. because dest is on another file system. dest may be an
+    existing directory.
+    """
+    if os.path.isdir(dest):
+        dest = os.path.join(dest, os.path.basename(src))
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+    return dest
+
 def get_instance_path(instance, relative=False):
     """Determine the correct path for instance storage.
 